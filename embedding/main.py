@@ -1,7 +1,15 @@
+import sys
 from dotenv import load_dotenv
 load_dotenv()
 
-from src.process import run_pipeline
+from src.process import run_pipeline, run_bm25_build, run_store_export, run_metadata_load
 
 if __name__ == "__main__":
-    run_pipeline()
+    if "--build-bm25" in sys.argv[1:]:
+        run_bm25_build()
+    elif "--export-store" in sys.argv[1:]:
+        run_store_export()
+    elif "--load-metadata" in sys.argv[1:]:
+        run_metadata_load()
+    else:
+        run_pipeline()
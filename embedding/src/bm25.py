@@ -0,0 +1,93 @@
+import json
+import logging
+import re
+from array import array
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Any, Dict, Iterable
+
+# on-disk layout read by search/lexical.py:
+#   meta.json      {"docs": N, "avgdl": ..., "title_boost": ...}
+#   doc_ids.txt    one paper id per line, line i is doc i
+#   doc_lens.bin   uint32 token count per doc
+#   lexicon.tsv    term \t df \t offset, sorted by term; postings of a term are [offset, offset + df)
+#   postings_docs.bin  uint32 doc numbers, ascending within a term
+#   postings_tfs.bin   uint8 term frequencies (clipped at 255)
+META_FILE = "meta.json"
+DOC_IDS_FILE = "doc_ids.txt"
+DOC_LENS_FILE = "doc_lens.bin"
+LEXICON_FILE = "lexicon.tsv"
+POSTINGS_DOCS_FILE = "postings_docs.bin"
+POSTINGS_TFS_FILE = "postings_tfs.bin"
+
+# keeps model names and acronyms like "gpt-4", "llama-2", "t5", "resnet50", "o1.5" as single tokens
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-.][a-z0-9]+)*")
+
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the their this "
+    "to was we were which with our these those can not".split()
+)
+
+
+def tokenize(text: str):
+    """ Must stay identical to tokenize() in search/lexical.py. """
+    return [t for t in TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+def build_bm25_index(papers: Iterable[Dict[str, Any]], config: Dict[str, Any]):
+    """
+    Builds a BM25 inverted index over title + abstract for the search server's hybrid retrieval.
+
+    Args:
+        papers: paper dicts, e.g. the filtered stream from process.generate_batches
+        config: the `bm25` section of config.yaml
+    """
+    index_dir = Path(config.get("path", "data/bm25"))
+    index_dir.mkdir(parents=True, exist_ok=True)
+    title_boost = config.get("title_boost", 2)
+
+    postings = defaultdict(lambda: (array("I"), array("B")))
+    doc_lens = array("I")
+    total_len = 0
+
+    with open(index_dir / DOC_IDS_FILE, "w", encoding="utf-8") as ids_file:
+        for doc, paper in enumerate(papers):
+            counts = Counter(tokenize(paper.get("abstract") or ""))
+            for token in tokenize(paper.get("title") or ""):
+                counts[token] += title_boost
+
+            for term, tf in counts.items():
+                docs, tfs = postings[term]
+                docs.append(doc)
+                tfs.append(min(tf, 255))
+
+            length = sum(counts.values())
+            doc_lens.append(length)
+            total_len += length
+            ids_file.write(f"{paper['id']}\n")
+
+            if (doc + 1) % 100_000 == 0:
+                logging.info(f"BM25: indexed {doc + 1} papers, {len(postings)} terms")
+
+    offset = 0
+    with open(index_dir / POSTINGS_DOCS_FILE, "wb") as docs_file, \
+            open(index_dir / POSTINGS_TFS_FILE, "wb") as tfs_file, \
+            open(index_dir / LEXICON_FILE, "w", encoding="utf-8") as lexicon:
+        for term in sorted(postings):
+            docs, tfs = postings[term]
+            docs.tofile(docs_file)
+            tfs.tofile(tfs_file)
+            lexicon.write(f"{term}\t{len(docs)}\t{offset}\n")
+            offset += len(docs)
+
+    with open(index_dir / DOC_LENS_FILE, "wb") as f:
+        doc_lens.tofile(f)
+
+    meta = {
+        "docs": len(doc_lens),
+        "avgdl": total_len / max(len(doc_lens), 1),
+        "title_boost": title_boost,
+        "postings": offset,
+    }
+    (index_dir / META_FILE).write_text(json.dumps(meta))
+    logging.info(f"Built BM25 index over {meta['docs']} papers ({len(postings)} terms, {offset} postings) in '{index_dir}'")
@@ -1,9 +1,89 @@
+import hashlib
+import json
+import os
 from pathlib import Path
+from typing import Any, Dict, Optional
 
-def load_checkpoint(path: Path) -> str | None:
-    if path.exists():
-        return path.read_text().strip() or None
-    return None
+# bytes hashed at each end of the snapshot for its fingerprint
+_FINGERPRINT_BYTES = 1024 * 1024
 
-def save_checkpoint(path: Path, last_id: str):
-    path.write_text(last_id)
\ No newline at end of file
+
+class CheckpointMismatch(ValueError):
+    """ The checkpoint cannot be applied to the dataset being ingested. """
+
+
+def file_fingerprint(path: str) -> Dict[str, Any]:
+    """
+    Cheap identity of a snapshot: its size plus a hash of its first and last MB.
+    A new arXiv snapshot differs in both, while the fingerprint takes milliseconds on a multi-GB file.
+    """
+    size = os.path.getsize(path)
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        digest.update(f.read(_FINGERPRINT_BYTES))
+        f.seek(max(size - _FINGERPRINT_BYTES, 0))
+        digest.update(f.read(_FINGERPRINT_BYTES))
+    return {"size": size, "sha256": digest.hexdigest()}
+
+
+def load_checkpoint(path: Path, dataset_path: str) -> Optional[Dict[str, Any]]:
+    """
+    Returns the checkpoint record {"offset", "last_id", "fingerprint"}, or None if there is none.
+    Raises CheckpointMismatch if it was taken against a different snapshot.
+    """
+    if not path.exists() or not path.read_text().strip():
+        return None
+
+    try:
+        record = json.loads(path.read_text())
+        offset = record["offset"]
+    except (ValueError, TypeError, KeyError):
+        raise CheckpointMismatch(
+            f"'{path}' is not a byte-offset checkpoint (written by an older version?). "
+            "Delete it to start over; with the embedding store enabled, already embedded papers are not re-embedded."
+        ) from None
+
+    if record.get("fingerprint") != file_fingerprint(dataset_path):
+        raise CheckpointMismatch(
+            f"'{path}' was taken against a different snapshot than '{dataset_path}' "
+            f"(last paper {record.get('last_id')}). Delete it, or point dataset.checkpoint_path elsewhere."
+        )
+    if offset > record["fingerprint"]["size"]:
+        raise CheckpointMismatch(f"'{path}' points past the end of '{dataset_path}'")
+    return record
+
+
+def save_checkpoint(path: Path, record: Dict[str, Any]):
+    """ Writes the record atomically: a crash leaves either the old or the new checkpoint, never a torn one. """
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w") as f:
+        json.dump(record, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class CheckpointTracker:
+    """
+    Advances the checkpoint over the contiguous prefix of completed batches only, so a
+    resume never skips a batch that finished after a later one.
+    """
+
+    def __init__(self, path: Path, fingerprint: Dict[str, Any]):
+        self.path = path
+        self.fingerprint = fingerprint
+        self._next_seq = 0
+        self._completed = {}
+
+    def complete(self, seq: int, last_id: str, offset: int):
+        """ Marks batch `seq` as written to all sinks; `offset` is the byte just past its last record. """
+        self._completed[seq] = (last_id, offset)
+
+        last = None
+        while self._next_seq in self._completed:
+            last = self._completed.pop(self._next_seq)
+            self._next_seq += 1
+
+        if last is not None:
+            last_id, offset = last
+            save_checkpoint(self.path, {"offset": offset, "last_id": last_id, "fingerprint": self.fingerprint})
@@ -1,13 +1,55 @@
 import logging
 import os
+import random
+import threading
+import time
+from datetime import datetime, timezone
 from supabase import create_client, Client
-from typing import Dict, Any, List
+from typing import Dict, Any, Callable, List
+
+# columns of the papers table, in COPY order
+COLUMNS = ["id", "title", "authors", "categories", "abstract", "update_date", "doi"]
+
+_client = None
+_client_lock = threading.Lock()
+
 
 def get_supabase_client(config: Dict[str, Any]) -> Client:
-    """ Initializes and returns a Supabase client. """
-    url = os.getenv("SUPABASE_URL")
-    key = os.getenv("SUPABASE_SERVICE_KEY")
-    return create_client(url, key)
+    """ Returns the process-wide Supabase client, so every batch reuses its pooled connections. """
+    global _client
+    with _client_lock:
+        if _client is None:
+            url = os.getenv("SUPABASE_URL")
+            key = os.getenv("SUPABASE_SERVICE_KEY")
+            _client = create_client(url, key)
+        return _client
+
+
+def paper_row(paper: Dict[str, Any]) -> Dict[str, Any]:
+    return {column: paper.get(column) for column in COLUMNS}
+
+
+def with_retries(func: Callable, *args, retries: int = 3, base_delay: float = 1.0, **kwargs):
+    """ Runs func, retrying any exception with exponential backoff and jitter; re-raises the last one. """
+    for attempt in range(retries):
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            if attempt == retries - 1:
+                raise
+            delay = base_delay * (2 ** attempt) + random.random()
+            logging.warning(f"{func.__name__} failed ({e}), retry {attempt + 1}/{retries - 1} in {delay:.2f}s")
+            time.sleep(delay)
+
+
+def _dedupe(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # a single upsert statement may not touch the same key twice; keep the last version
+    return list({row["id"]: row for row in rows}.values())
+
+
+def _upsert_rest(rows: List[Dict[str, Any]], table: str, config: Dict[str, Any]):
+    get_supabase_client(config).table(table).upsert(rows).execute()
+
 
 def store_metadata_supabase(batch: List[Dict[str, Any]], config: Dict[str, Any]):
     """
@@ -20,32 +62,115 @@ def store_metadata_supabase(batch: List[Dict[str, Any]], config: Dict[str, Any])
         abstract (text)
         update_date (date)
         doi (text)
-    Uses upsert to avoid duplicating papers.
+    Uses upsert to avoid duplicating papers. With `loader: postgres` the rows go over a
+    direct Postgres connection instead of the REST API (see PostgresLoader).
+    Failed chunks are retried and then raised, never dropped.
+    """
+    rows = _dedupe([paper_row(paper) for paper in batch])
+    retries = config.get("retries", 3)
+
+    if config.get("loader", "rest") == "postgres":
+        with_retries(get_postgres_loader(config).copy_upsert, rows, retries=retries)
+    else:
+        chunk_size = config.get("upsert_chunk_size", 1000)
+        for i in range(0, len(rows), chunk_size):
+            with_retries(_upsert_rest, rows[i : i + chunk_size], config["papers_table"], config, retries=retries)
+
+    logging.info(f"Stored metadata for batch of {len(batch)} papers")
+
+
+def bump_collection_version(collection: str, config: Dict[str, Any]) -> str:
     """
-    supabase = get_supabase_client(config)
-
-    try:
-        # prepare batch data in the correct format
-        data_batch = [
-            {
-                "id": paper.get("id"),
-                "title": paper.get("title"),
-                "authors": paper.get("authors"),
-                "categories": paper.get("categories"),
-                "abstract": paper.get("abstract"),
-                "update_date": paper.get("update_date"),
-                "doi": paper.get("doi"),
-            }
-            for paper in batch
-        ]
-
-        # upsert the entire batch at once
-        response = supabase.table(config["papers_table"]).upsert(data_batch).execute()
-
-        if hasattr(response, "error") and response.error:
-            logging.error(f"Supabase batch insert error: {response.error}")
-        else:
-            logging.info(f"Stored metadata for batch of {len(batch)} papers")
-
-    except Exception as e:
-        logging.error(f"Failed to store metadata batch: {e}")
+    Writes a new version marker for the collection. The search servers include it in their
+    result cache keys, so this invalidates every cached search response.
+    Expected Supabase table schema (`versions_table`):
+        collection (text, primary key)
+        version (text)
+        updated_at (timestamptz)
+    """
+    now = datetime.now(timezone.utc)
+    version = now.strftime("%Y%m%dT%H%M%S.%fZ")
+    row = {"collection": collection, "version": version, "updated_at": now.isoformat()}
+    with_retries(_upsert_rest, [row], config["versions_table"], config, retries=config.get("retries", 3))
+    logging.info(f"Bumped version of collection '{collection}' to {version}")
+    return version
+
+
+class PostgresLoader:
+    """
+    Bulk upserts into the papers table over one direct Postgres connection (psycopg 3).
+
+    Each chunk is streamed with COPY into a temporary staging table and merged with one
+    INSERT ... ON CONFLICT, which is far cheaper than PostgREST round trips of JSON rows.
+    Connects to $DATABASE_URL, e.g. the Supabase "direct connection" string.
+    """
+
+    def __init__(self, dsn: str, table: str = "papers"):
+        try:
+            import psycopg
+            from psycopg import sql
+        except ImportError as e:
+            raise RuntimeError("The postgres metadata loader requires the `psycopg` package") from e
+
+        self._psycopg = psycopg
+        self._sql = sql
+        self.dsn = dsn
+        self.table = table
+        self._conn = None
+        # one connection, shared by the store workers' threads one chunk at a time
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        if self._conn is None or self._conn.closed:
+            self._conn = self._psycopg.connect(self.dsn)
+        return self._conn
+
+    def copy_upsert(self, rows: List[Dict[str, Any]]):
+        if not rows:
+            return
+        sql = self._sql
+        table = sql.Identifier(self.table)
+        columns = sql.SQL(", ").join(map(sql.Identifier, COLUMNS))
+        updates = sql.SQL(", ").join(
+            sql.SQL("{0} = EXCLUDED.{0}").format(sql.Identifier(c)) for c in COLUMNS if c != "id"
+        )
+
+        with self._lock:
+            conn = self._connection()
+            try:
+                with conn.transaction(), conn.cursor() as cur:
+                    cur.execute(
+                        sql.SQL("CREATE TEMP TABLE papers_staging (LIKE {} INCLUDING DEFAULTS) ON COMMIT DROP").format(table)
+                    )
+                    with cur.copy(sql.SQL("COPY papers_staging ({}) FROM STDIN").format(columns)) as copy:
+                        for row in rows:
+                            copy.write_row([row[c] for c in COLUMNS])
+                    cur.execute(
+                        sql.SQL(
+                            "INSERT INTO {table} ({columns}) SELECT DISTINCT ON (id) {columns} FROM papers_staging "
+                            "ON CONFLICT (id) DO UPDATE SET {updates}"
+                        ).format(table=table, columns=columns, updates=updates)
+                    )
+            except self._psycopg.OperationalError:
+                # broken connection: drop it so the retry reconnects
+                conn.close()
+                raise
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+
+
+_loader = None
+
+
+def get_postgres_loader(config: Dict[str, Any]) -> PostgresLoader:
+    global _loader
+    with _client_lock:
+        if _loader is None:
+            dsn = os.getenv("DATABASE_URL")
+            if not dsn:
+                raise ValueError("DATABASE_URL not found (needed for supabase.loader: postgres).")
+            _loader = PostgresLoader(dsn, config["papers_table"])
+        return _loader
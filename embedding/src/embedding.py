@@ -1,44 +1,29 @@
 import logging
-import time
-import os
-from typing import List, Dict, Any
-from openai import OpenAI
-from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
-
-api_key = os.getenv("OPENAI_API_KEY")
-if not api_key:
-    raise ValueError("OPENAI_API_KEY not found.")
-
-client = OpenAI(api_key=api_key)
-
-@retry( # retry if api call fails
-    stop=stop_after_attempt(5),
-    wait=wait_exponential(multiplier=2, min=2, max=60),
-    retry=retry_if_exception_type(Exception),
-    reraise=True
-)
-def _embed_batch(texts: List[str], model: str) -> List[List[float]]:
-    """ Helper which calls the API once for a batch of texts. """
-    response = client.embeddings.create(model=model, input=texts)
-    return [d.embedding for d in response.data]
+from typing import List, Dict, Any, Optional
+
+from .embedding_store import EmbeddingStore
+from .providers import EmbeddingProvider
 
 
 def generate_embeddings_for_papers(
     papers: List[Dict[str, Any]],
     text_field: str,
     id_field: str,
-    model: str,
+    provider: EmbeddingProvider,
     batch_size: int = 100,
+    store: Optional[EmbeddingStore] = None,
 ) -> List[Dict[str, Any]]:
     """
     Generate embeddings for a batch of paper dicts while preserving their IDs.
+    With a store, texts already embedded under the same model are read from it
+    and only the rest are sent to the provider.
     
     Returns:
         List of dicts: [{"id": ..., "embedding": [...]}]
     """
     results = []
     total = len(papers)
-    logging.info(f"Generating embeddings for {total} papers with model {model}")
+    logging.info(f"Generating embeddings for {total} papers with {provider.model_id}")
 
     for i in range(0, total, batch_size):
         batch = papers[i : i + batch_size]
@@ -46,7 +31,9 @@ def generate_embeddings_for_papers(
         batch_ids = [p[id_field] for p in batch]
 
         try:
-            embeddings = _embed_batch(batch_texts, model)
+            embeddings = _embed_with_store(batch_texts, provider, store) if store else provider.embed(batch_texts)
+            if store:
+                store.link_many(batch_ids, batch_texts, provider.model_id)
             batch_results = [
                 {"id": pid, "embedding": emb}
                 for pid, emb in zip(batch_ids, embeddings)
@@ -61,3 +48,19 @@ def generate_embeddings_for_papers(
         logging.warning(f"Expected {total} embeddings but got {len(results)}")
 
     return results
+
+
+def _embed_with_store(texts: List[str], provider: EmbeddingProvider, store: EmbeddingStore) -> List[List[float]]:
+    """ Embeds only the texts missing from the store, and stores them. """
+    vectors = store.get_many(texts, provider.model_id)
+    missing = [i for i in range(len(texts)) if i not in vectors]
+
+    if missing:
+        missing_texts = [texts[i] for i in missing]
+        embedded = provider.embed(missing_texts)
+        store.put_many(missing_texts, embedded, provider.model_id)
+        vectors.update(zip(missing, embedded))
+
+    if len(missing) < len(texts):
+        logging.info(f"Embedding store: reused {len(texts) - len(missing)}/{len(texts)} vectors")
+    return [vectors[i] for i in range(len(texts))]
@@ -0,0 +1,132 @@
+import hashlib
+import logging
+import sqlite3
+import threading
+from array import array
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    key    BLOB PRIMARY KEY,  -- sha256(model_id, text)
+    model  TEXT NOT NULL,
+    vector BLOB NOT NULL      -- float32
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS papers (
+    model    TEXT NOT NULL,
+    paper_id TEXT NOT NULL,
+    key      BLOB NOT NULL,       -- current text of the paper
+    PRIMARY KEY (model, paper_id)
+) WITHOUT ROWID;
+"""
+
+# sqlite's default limit on host parameters in one statement is 999 on older builds
+_MAX_PARAMS = 900
+
+
+def content_key(model_id: str, text: str) -> bytes:
+    """ Content address of an embedding: the same text under the same model always maps to the same key. """
+    return hashlib.sha256(f"{model_id}\0{text}".encode("utf-8")).digest()
+
+
+def _pack(vector: List[float]) -> bytes:
+    return array("f", vector).tobytes()
+
+
+def _unpack(blob: bytes) -> List[float]:
+    vector = array("f")
+    vector.frombytes(blob)
+    return vector.tolist()
+
+
+class EmbeddingStore:
+    """
+    Persistent, content-addressed embedding store on SQLite.
+
+    Vectors are keyed by hash(model, text), so a paper whose abstract has not changed is
+    never embedded twice, whatever happened to the checkpoint or the filters. The `papers`
+    table records which key each paper id currently points to, which lets the store be
+    exported to Qdrant without any API calls.
+    """
+
+    def __init__(self, path: str):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        # embed workers call in from several threads; sqlite connections are not thread-safe
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, texts: List[str], model_id: str) -> Dict[int, List[float]]:
+        """ Looks up a batch of texts; returns {index in texts: vector} for the ones already stored. """
+        keys = [content_key(model_id, text) for text in texts]
+        found = {}
+        with self._lock:
+            for i in range(0, len(keys), _MAX_PARAMS):
+                chunk = keys[i : i + _MAX_PARAMS]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                found.update(rows)
+
+        vectors = {i: _unpack(found[key]) for i, key in enumerate(keys) if key in found}
+        self.hits += len(vectors)
+        self.misses += len(keys) - len(vectors)
+        return vectors
+
+    def put_many(self, texts: List[str], vectors: List[List[float]], model_id: str):
+        """ Stores freshly embedded texts. """
+        rows = [(content_key(model_id, text), model_id, _pack(vector)) for text, vector in zip(texts, vectors)]
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings (key, model, vector) VALUES (?, ?, ?)", rows)
+
+    def link_many(self, paper_ids: List[str], texts: List[str], model_id: str):
+        """ Points each paper id at the embedding of its current text. """
+        rows = [(pid, model_id, content_key(model_id, text)) for pid, text in zip(paper_ids, texts)]
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO papers (paper_id, model, key) VALUES (?, ?, ?)", rows)
+
+    def count(self, model_id: str) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM papers WHERE model = ?", (model_id,)).fetchone()[0]
+
+    def iter_arrays(self, model_id: str, batch_size: int = 1000) -> Iterator[Tuple[List[str], np.ndarray]]:
+        """
+        Yields the stored vectors of every known paper as (paper ids, float32 matrix) chunks,
+        ordered by paper id. The blobs are copied straight into the matrix, never through floats.
+        """
+        last_id = ""
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT p.paper_id, e.vector FROM papers p JOIN embeddings e ON e.key = p.key "
+                    "WHERE p.model = ? AND p.paper_id > ? ORDER BY p.paper_id LIMIT ?",
+                    (model_id, last_id, batch_size),
+                ).fetchall()
+            if not rows:
+                return
+            paper_ids = [pid for pid, _ in rows]
+            vectors = np.frombuffer(b"".join(blob for _, blob in rows), dtype=np.float32).reshape(len(rows), -1)
+            yield paper_ids, vectors
+            last_id = paper_ids[-1]
+
+    def stats(self) -> Tuple[int, int]:
+        return self.hits, self.misses
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def build_embedding_store(config: Dict[str, Any]) -> Optional[EmbeddingStore]:
+    """ Opens the store from the `embedding_store` config section, or returns None if disabled. """
+    if not config.get("enabled", False):
+        return None
+    path = config.get("path", "data/embeddings.sqlite")
+    logging.info(f"Using embedding store at '{path}'")
+    return EmbeddingStore(path)
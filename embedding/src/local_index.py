@@ -0,0 +1,138 @@
+import json
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Set, Tuple
+
+import numpy as np
+
+# on-disk layout read by search/vector_index.py:
+#   vectors.bin  row-major (count, dim) matrix of L2-normalized vectors in `dtype`
+#   ids.txt      one paper id per line, line i belongs to row i
+#   meta.json    {"dim": ..., "dtype": ..., "count": ..., "ids_bytes": ...}
+#   hnsw.bin     optional hnswlib index over the same rows (label = row number)
+VECTORS_FILE = "vectors.bin"
+IDS_FILE = "ids.txt"
+META_FILE = "meta.json"
+HNSW_FILE = "hnsw.bin"
+
+_lock = threading.Lock()
+# index dir -> (ids_bytes the set was read at, paper ids in the index)
+_known_ids: Dict[str, Tuple[int, Set[str]]] = {}
+
+
+def _read_meta(index_dir: Path) -> Dict[str, Any] | None:
+    meta_path = index_dir / META_FILE
+    if meta_path.exists():
+        return json.loads(meta_path.read_text())
+    return None
+
+
+def _indexed_ids(index_dir: Path, meta: Dict[str, Any]) -> Set[str]:
+    """ Paper ids already in the index, read once per process and re-read if another writer appended. """
+    cached = _known_ids.get(str(index_dir))
+    if cached is not None and cached[0] == meta["ids_bytes"]:
+        return cached[1]
+
+    ids: Set[str] = set()
+    if meta["ids_bytes"]:
+        with open(index_dir / IDS_FILE, "rb") as f:
+            ids = set(f.read(meta["ids_bytes"]).decode("utf-8").splitlines())
+    _known_ids[str(index_dir)] = (meta["ids_bytes"], ids)
+    return ids
+
+
+def store_vectors_local(embedding_results: List[Dict[str, Any]], config: Dict[str, Any]):
+    """
+    Appends a batch of embeddings to the local vector index used by the search server's
+    `vector_backend: local`. Vectors are normalized so search is a plain dot product.
+    Papers already in the index are skipped, so re-ingesting a file (e.g. after a checkpoint
+    mismatch) does not duplicate rows; to replace vectors, rebuild the index from scratch.
+
+    Args:
+        embedding_results: List[Dict[str, Any]] with fields {"id": str, "embedding": List[float]}
+        config: the `local_index` section of config.yaml
+    """
+    if not embedding_results:
+        return
+
+    index_dir = Path(config.get("path", "data/index"))
+    index_dir.mkdir(parents=True, exist_ok=True)
+    dtype = np.dtype(config.get("dtype", "float16"))
+
+    with _lock:
+        dim = len(embedding_results[0]["embedding"])
+        meta = _read_meta(index_dir) or {"dim": dim, "dtype": dtype.name, "count": 0, "ids_bytes": 0}
+        if meta["dim"] != dim or meta["dtype"] != dtype.name:
+            raise ValueError(
+                f"Local index at {index_dir} holds {meta['dim']}-d {meta['dtype']} vectors, "
+                f"got {dim}-d {dtype.name}"
+            )
+
+        known = _indexed_ids(index_dir, meta)
+        new_ids: Set[str] = set()
+        new_items = []
+        for item in embedding_results:
+            if item["id"] not in known and item["id"] not in new_ids:
+                new_ids.add(item["id"])
+                new_items.append(item)
+        skipped = len(embedding_results) - len(new_items)
+        if skipped:
+            logging.info(f"Skipped {skipped} papers already in local index '{index_dir}'")
+        if not new_items:
+            return
+
+        vectors = np.asarray([item["embedding"] for item in new_items], dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.where(norms == 0, 1.0, norms)
+        ids_blob = "".join(f"{item['id']}\n" for item in new_items).encode("utf-8")
+
+        # meta is written last, so a crash mid-append leaves trailing bytes that meta does not
+        # count; they are truncated away on the next append
+        with open(index_dir / VECTORS_FILE, "ab") as f:
+            f.truncate(meta["count"] * meta["dim"] * dtype.itemsize)
+            f.write(vectors.astype(dtype).tobytes())
+        with open(index_dir / IDS_FILE, "ab") as f:
+            f.truncate(meta["ids_bytes"])
+            f.write(ids_blob)
+
+        meta["count"] += len(new_items)
+        meta["ids_bytes"] += len(ids_blob)
+        tmp = index_dir / (META_FILE + ".tmp")
+        tmp.write_text(json.dumps(meta))
+        tmp.replace(index_dir / META_FILE)
+        # only once the append is complete, so a failed write is not remembered as indexed
+        known.update(new_ids)
+        _known_ids[str(index_dir)] = (meta["ids_bytes"], known)
+
+    logging.info(f"Appended {len(new_items)} vectors to local index '{index_dir}'")
+
+
+def build_hnsw_index(config: Dict[str, Any]):
+    """ Builds the optional HNSW approximate index over the local vector matrix (needs hnswlib). """
+    try:
+        import hnswlib
+    except ImportError as e:
+        raise RuntimeError("Building an HNSW index requires the `hnswlib` package") from e
+
+    index_dir = Path(config.get("path", "data/index"))
+    meta = _read_meta(index_dir)
+    if not meta or not meta["count"]:
+        logging.warning(f"Local index at {index_dir} is empty, skipping HNSW build")
+        return
+
+    matrix = np.memmap(index_dir / VECTORS_FILE, dtype=meta["dtype"], mode="r", shape=(meta["count"], meta["dim"]))
+
+    index = hnswlib.Index(space="ip", dim=meta["dim"])
+    index.init_index(
+        max_elements=meta["count"],
+        M=config.get("hnsw_m", 16),
+        ef_construction=config.get("hnsw_ef_construction", 200),
+    )
+    chunk = 100_000
+    for start in range(0, meta["count"], chunk):
+        rows = np.asarray(matrix[start : start + chunk], dtype=np.float32)
+        index.add_items(rows, np.arange(start, start + len(rows)))
+
+    index.save_index(str(index_dir / HNSW_FILE))
+    logging.info(f"Built HNSW index over {meta['count']} vectors in '{index_dir}'")
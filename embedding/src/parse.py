@@ -0,0 +1,173 @@
+import json
+import logging
+import os
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+try:  # much faster than the stdlib decoder on multi-GB snapshots
+    import orjson
+
+    _loads = orjson.loads
+    _DecodeError = orjson.JSONDecodeError
+except ImportError:
+    _loads = json.loads
+    _DecodeError = json.JSONDecodeError
+
+_UPDATE_YEAR_RE = re.compile(rb'"update_date"\s*:\s*"(\d{4})')
+
+
+class PaperFilter:
+    """
+    Category / year filter for arXiv records.
+
+    `prefilter` works on the raw line bytes, so records that cannot match are dropped
+    without being decoded. It only rejects lines that certainly fail; `matches` makes
+    the exact decision on the decoded record.
+    """
+
+    def __init__(
+        self,
+        categories: List[str],
+        from_year: Optional[int] = None,
+        to_year: Optional[int] = None,
+        categories_field: str = "categories",
+    ):
+        self.categories = set(categories)
+        self.from_year = from_year
+        self.to_year = to_year
+        self.categories_field = categories_field
+        self._category_bytes = [c.encode("utf-8") for c in self.categories]
+
+    @classmethod
+    def from_config(cls, dataset_config: Dict[str, Any]) -> "PaperFilter":
+        return cls(
+            dataset_config.get("categories", ["cs.LG"]),
+            from_year=dataset_config.get("from_year"),
+            to_year=dataset_config.get("to_year"),
+            categories_field=dataset_config.get("categories_field", "categories"),
+        )
+
+    def _year_ok(self, year: int) -> bool:
+        if self.from_year is not None and year < self.from_year:
+            return False
+        if self.to_year is not None and year > self.to_year:
+            return False
+        return True
+
+    def prefilter(self, line: bytes) -> bool:
+        if self.categories and not any(c in line for c in self._category_bytes):
+            return False
+        match = _UPDATE_YEAR_RE.search(line)
+        if match and not self._year_ok(int(match.group(1))):
+            return False
+        return True
+
+    def matches(self, paper: Dict[str, Any]) -> bool:
+        if self.categories and self.categories.isdisjoint((paper.get(self.categories_field) or "").split()):
+            return False
+        if self.from_year is None and self.to_year is None:
+            return True
+        try:
+            update_str = paper.get("update_date")
+            if not update_str:
+                return False
+            return self._year_ok(datetime.strptime(update_str, "%Y-%m-%d").year)
+        except Exception as e:
+            logging.warning(f"Invalid date for paper {paper.get('id', 'unknown')}: {e}")
+            return False
+
+
+def split_ranges(path: str, chunk_bytes: int, start: int = 0) -> List[Tuple[int, int]]:
+    """
+    Splits a JSONL file from byte `start` into [start, end) byte ranges that begin and end
+    on line boundaries. `start` must itself be a line boundary, e.g. a checkpoint offset.
+    """
+    size = os.path.getsize(path)
+    bounds = [start]
+    with open(path, "rb") as f:
+        while bounds[-1] < size:
+            f.seek(min(bounds[-1] + chunk_bytes, size))
+            f.readline()  # move to the end of the line the cut landed in
+            bounds.append(min(f.tell(), size))
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def parse_range(path: str, start: int, end: int, paper_filter: PaperFilter) -> List[Tuple[int, Dict[str, Any]]]:
+    """
+    Decodes the matching records in one byte range. Runs in a worker process.
+    Returns (offset just past the record's line, record) pairs.
+    """
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+
+    papers = []
+    invalid = 0
+    offset = start
+    for line in data.split(b"\n"):
+        offset += len(line) + 1
+        if not line.strip() or not paper_filter.prefilter(line):
+            continue
+        try:
+            paper = _loads(line)
+        except _DecodeError:
+            invalid += 1
+            continue
+        if paper_filter.matches(paper):
+            papers.append((min(offset, end), paper))
+
+    if invalid:
+        logging.warning(f"Skipped {invalid} invalid JSON lines in bytes {start}-{end}")
+    return papers
+
+
+def parse_papers_with_offsets(
+    path: str,
+    paper_filter: PaperFilter,
+    workers: int = 4,
+    chunk_bytes: int = 32 * 1024 * 1024,
+    start: int = 0,
+) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """
+    Yields (end offset, record) for the records of a JSONL snapshot that pass `paper_filter`,
+    in file order, starting at byte `start`. The end offset is where a resume picks up after
+    that record. Byte ranges are parsed on a process pool, with at most 2 x workers ranges in
+    flight so memory stays bounded on multi-GB files.
+    """
+    ranges = split_ranges(path, chunk_bytes, start)
+
+    if workers <= 1 or len(ranges) <= 1:
+        for range_start, range_end in ranges:
+            yield from parse_range(path, range_start, range_end, paper_filter)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        remaining = iter(ranges)
+        pending = deque()
+
+        def submit_next():
+            next_range = next(remaining, None)
+            if next_range is not None:
+                pending.append(pool.submit(parse_range, path, *next_range, paper_filter))
+
+        for _ in range(workers * 2):
+            submit_next()
+
+        while pending:
+            papers = pending.popleft().result()
+            submit_next()
+            yield from papers
+
+
+def parse_papers(
+    path: str,
+    paper_filter: PaperFilter,
+    workers: int = 4,
+    chunk_bytes: int = 32 * 1024 * 1024,
+) -> Iterator[Dict[str, Any]]:
+    """ Yields the records of a JSONL snapshot that pass `paper_filter`, in file order. """
+    for _, paper in parse_papers_with_offsets(path, paper_filter, workers, chunk_bytes):
+        yield paper
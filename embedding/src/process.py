@@ -1,18 +1,24 @@
-import json
 import time
+import contextlib
 import logging
 import random
 from pathlib import Path
 import yaml
 from typing import List, Dict, Any
-from datetime import datetime
 import asyncio
+from collections import deque
 from concurrent.futures import ThreadPoolExecutor
 
 from .embedding import generate_embeddings_for_papers
-from .db import store_metadata_supabase
-from .vector import store_vectors_qdrant, check_qdrant_collection
-from .checkpoint import load_checkpoint, save_checkpoint
+from .providers import create_provider
+from .ratelimit import parse_retry_after
+from .embedding_store import build_embedding_store
+from .db import store_metadata_supabase, bump_collection_version
+from .vector import store_vectors_qdrant, check_qdrant_collection, bulk_load_qdrant, deferred_indexing
+from .local_index import store_vectors_local, build_hnsw_index
+from .bm25 import build_bm25_index
+from .parse import PaperFilter, parse_papers_with_offsets
+from .checkpoint import load_checkpoint, file_fingerprint, CheckpointTracker
 
 # load config.yaml
 CONFIG_PATH = Path(__file__).parent.parent / "config.yaml"
@@ -33,7 +39,24 @@ console = logging.StreamHandler()
 console.setLevel(logging.INFO)
 logging.getLogger().addHandler(console)
 
+# same provider as the search server, so query and paper vectors share a space
+provider = create_provider(config)
+
+# vectors already paid for, keyed by hash(model, text); survives lost checkpoints and filter changes
+embedding_store = build_embedding_store(config.get("embedding_store", {}))
+
 # helper funcs
+
+def publish_collection_version():
+    """ Invalidates the search servers' cached responses after the indexed data changed. """
+    supabase_cfg = config["supabase"]
+    if not supabase_cfg.get("versions_table"):
+        return
+    try:
+        bump_collection_version(config["qdrant"]["collection_name"], supabase_cfg)
+    except Exception as e:
+        logging.error(f"Could not bump the collection version, search result caches stay stale until they expire: {e}")
+
 async def with_backoff(func, *args, retries=3, base_delay=2.0, **kwargs):
     """ Retries async or sync functions with exponential backoff and jitter. """
     kwargs.pop("retries", None)
@@ -60,98 +83,164 @@ async def with_backoff(func, *args, retries=3, base_delay=2.0, **kwargs):
                 continue
             raise
 
-def is_after_year(paper, year):
-    try:
-        update_str = paper.get("update_date")
-        if not update_str:
-            return False
-        update_date = datetime.strptime(update_str, "%Y-%m-%d")
-        return update_date.year >= year
-    except Exception as e:
-        logging.warning(f"Invalid date for paper {paper.get('id', 'unknown')}: {e}")
-        return False
-
-
-def load_dataset(path: str):
-    """Streams JSON dataset line by line."""
-    with open(path, "r", encoding="utf-8") as f:
-        for line_num, line in enumerate(f, start=1):
-            if line.strip():
-                try:
-                    yield json.loads(line)
-                except json.JSONDecodeError as e:
-                    logging.warning(f"Skipping invalid JSON at line {line_num}: {e}")
-
+def generate_batches(dataset_path, batch_size, start_offset=0):
+    """ Yields (batch, byte offset just past its last paper) from `start_offset` on. """
+    dataset = config["dataset"]
+    papers = parse_papers_with_offsets(
+        dataset_path,
+        PaperFilter.from_config(dataset),
+        workers=dataset.get("parse_workers", 4),
+        chunk_bytes=int(dataset.get("parse_chunk_mb", 32) * 1024 * 1024),
+        start=start_offset,
+    )
 
-def generate_batches(dataset_path, batch_size):
     batch = []
-    for paper in load_dataset(dataset_path):
-        if "cs.LG" not in paper["categories"].split():
-            continue
-        if not is_after_year(paper, config["dataset"]["from_year"]):
-            continue
-
+    end_offset = start_offset
+    for end_offset, paper in papers:
         batch.append(paper)
         if len(batch) >= batch_size:
-            yield batch
+            yield batch, end_offset
             batch = []
 
     if batch:
-        yield batch
+        yield batch, end_offset
 
 
-async def process_batch(batch: List[Dict[str, Any]]):
-    """Process a single batch asynchronously: embedding + DB + Qdrant."""
-    retries = config["advanced"].get("retries", 3)
+async def embed_batch(batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Embed stage: generate embeddings for one batch.
+    Pacing is the provider's rate limiter; this is the only retry layer for embedding calls.
+    """
+    retries = config["advanced"].get("max_retries", 5)
     base_delay = config["advanced"].get("base_delay", 2.0)
 
-    try:
-        embedding_results = await with_backoff(
-            generate_embeddings_for_papers,
-            batch,
-            config["dataset"]["abstract_field"],
-            config["dataset"]["id_field"],
-            config["openai"]["model"],
-            len(batch), 
-            retries=retries, 
-            base_delay=base_delay
-        )
-        logging.info(f"Generated embeddings for batch of {len(batch)} papers")
-    except Exception as e:
-        last_id = batch[-1]["id"]
-        logging.error(f"Failed embedding batch ending at ID {last_id}: {e}")
-        return
+    for attempt in range(retries):
+        try:
+            embedding_results = await asyncio.to_thread(
+                generate_embeddings_for_papers,
+                batch,
+                config["dataset"]["abstract_field"],
+                config["dataset"]["id_field"],
+                provider,
+                len(batch),
+                embedding_store,
+            )
+            break
+        except Exception as e:
+            if attempt == retries - 1 or not provider.is_transient(e):
+                raise
+            rate_limited = getattr(e, "status_code", None) == 429
+            if rate_limited and getattr(provider, "limiter", None) is not None:
+                # the limiter is already paused for retry-after and holds the next call until then
+                delay = 0
+            else:
+                delay = base_delay * (2 ** attempt) + random.random()
+                response = getattr(e, "response", None)
+                if rate_limited and response is not None and response.headers.get("retry-after"):
+                    delay = max(delay, parse_retry_after(response.headers.get("retry-after")))
+            logging.warning(f"Embedding attempt {attempt + 1}/{retries} failed: {e}. Retrying in {delay:.2f}s...")
+            await asyncio.sleep(delay)
+
+    logging.info(f"Generated embeddings for batch of {len(batch)} papers")
+    return embedding_results
+
+
+async def store_batch(batch: List[Dict[str, Any]], embedding_results: List[Dict[str, Any]]):
+    """Sink stage: write one embedded batch to Supabase, Qdrant and the local index concurrently."""
+    retries = config["advanced"].get("retries", 3)
+    base_delay = config["advanced"].get("base_delay", 2.0)
 
     async def store_metadata():
-        await with_backoff(store_metadata_supabase, batch, config["supabase"], retries=retries, base_delay=base_delay)
+        # retries failed chunks itself
+        await asyncio.to_thread(store_metadata_supabase, batch, config["supabase"])
 
     async def store_vectors():
-        await with_backoff(store_vectors_qdrant, embedding_results, config["qdrant"], retries=retries, base_delay=base_delay)
+        await with_backoff(store_vectors_qdrant, embedding_results, config["qdrant"], batch, retries=retries, base_delay=base_delay)
 
-    await asyncio.gather(store_metadata(), store_vectors())
+    async def store_local():
+        await asyncio.to_thread(store_vectors_local, embedding_results, config["local_index"])
 
+    sinks = [store_metadata()]
+    if config["qdrant"].get("enabled", True):
+        sinks.append(store_vectors())
+    if config.get("local_index", {}).get("enabled", False):
+        sinks.append(store_local())
 
-async def run_pipeline_async(dataset_path, batch_size, checkpoint_path, sleep_time, last_processed):
-    total_processed = 0
+    await asyncio.gather(*sinks)
 
-    for batch in generate_batches(dataset_path, batch_size):
-        if last_processed:
-            # skip all papers up to (and including) last_processed
-            if batch[-1]["id"] <= last_processed:
-                continue
-            else:
-                last_processed = None  # start normal processing after skip
 
-        total_processed += len(batch)
-        logging.info(f"Processing batch ending at paper {total_processed}")
+async def run_pipeline_async(dataset_path, batch_size, checkpoint_path, fingerprint, start_offset=0):
+    """
+    Staged ingestion pipeline:
 
-        await process_batch(batch)
+        parse + filter -> embed_queue -> embed workers (max_workers) -> store_queue -> store workers
 
-        # save checkpoint (last paper in batch)
-        last_id = batch[-1]["id"]
-        save_checkpoint(checkpoint_path, last_id)
+    Stages are connected by bounded queues, so a slow stage applies backpressure to the
+    ones before it. Batches finish out of order; the checkpoint only advances over the
+    contiguous prefix of batches whose sinks have all completed, and records the byte
+    offset a resume seeks to.
+    """
+    advanced = config["advanced"]
+    embed_workers = advanced.get("max_workers", 4)
+    store_workers = advanced.get("store_workers", 2)
+    queue_size = advanced.get("queue_size", embed_workers * 2)
 
-        await asyncio.sleep(sleep_time)  # async-friendly sleep
+    embed_queue = asyncio.Queue(maxsize=queue_size)
+    store_queue = asyncio.Queue(maxsize=queue_size)
+    tracker = CheckpointTracker(checkpoint_path, fingerprint)
+    total_processed = 0
+
+    async def produce():
+        nonlocal total_processed
+        batches = generate_batches(dataset_path, batch_size, start_offset)
+        seq = 0
+        while True:
+            # parsing is blocking file io + json decoding, keep it off the event loop
+            item = await asyncio.to_thread(next, batches, None)
+            if item is None:
+                break
+
+            batch, end_offset = item
+            total_processed += len(batch)
+            logging.info(f"Queued batch {seq} ending at paper {total_processed}")
+            await embed_queue.put((seq, batch, end_offset))
+            seq += 1
+
+    async def embed_worker():
+        while True:
+            seq, batch, end_offset = await embed_queue.get()
+            try:
+                embedding_results = await embed_batch(batch)
+            except Exception as e:
+                raise RuntimeError(f"Failed embedding batch {seq} ending at ID {batch[-1]['id']}: {e}") from e
+            await store_queue.put((seq, batch, end_offset, embedding_results))
+            embed_queue.task_done()
+
+    async def store_worker():
+        while True:
+            seq, batch, end_offset, embedding_results = await store_queue.get()
+            await store_batch(batch, embedding_results)
+            tracker.complete(seq, batch[-1]["id"], end_offset)
+            store_queue.task_done()
+
+    workers = [asyncio.create_task(embed_worker()) for _ in range(embed_workers)]
+    workers += [asyncio.create_task(store_worker()) for _ in range(store_workers)]
+
+    async def drain():
+        await produce()
+        await embed_queue.join()
+        await store_queue.join()
+
+    # a failing worker stops the whole pipeline, leaving the checkpoint at the last contiguous batch
+    drained = asyncio.create_task(drain())
+    try:
+        done, _ = await asyncio.wait([drained, *workers], return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            task.result()
+    finally:
+        for task in [drained, *workers]:
+            task.cancel()
+        await asyncio.gather(drained, *workers, return_exceptions=True)
 
     logging.info(f"Data ingestion completed successfully. Total processed: {total_processed}")
 
@@ -161,27 +250,137 @@ def run_pipeline():
 
     dataset_path = config["dataset"]["path"]
     batch_size = config["openai"]["batch_size"]
-    sleep_time = config["openai"].get("sleep_between_batches", 1)
-    checkpoint_path = Path(config["dataset"].get("checkpoint_path", "checkpoint.txt"))
+    checkpoint_path = Path(config["dataset"].get("checkpoint_path", "checkpoint.json"))
 
-    check_qdrant_collection(config["qdrant"])  # ensure qdrant is ready
+    vector_size = config["qdrant"].get("vector_size")
+    if provider.dimension and vector_size and provider.dimension != vector_size:
+        raise ValueError(
+            f"{provider.model_id} produces {provider.dimension}-d vectors but qdrant.vector_size is {vector_size}"
+        )
 
-    if checkpoint_path.exists():
-        last_processed = load_checkpoint(checkpoint_path)
-        logging.info(f"Resuming from checkpoint: {last_processed}")
+    # refuses checkpoints taken against another snapshot (raises CheckpointMismatch)
+    checkpoint = load_checkpoint(checkpoint_path, dataset_path)
+    if checkpoint:
+        start_offset = checkpoint["offset"]
+        logging.info(f"Resuming from checkpoint: paper {checkpoint['last_id']}, byte offset {start_offset}")
     else:
-        checkpoint_path.touch()
-        last_processed = None
+        start_offset = 0
         logging.info("No checkpoint found. Starting from scratch.")
 
+    if config["qdrant"].get("enabled", True):
+        check_qdrant_collection(config["qdrant"])  # ensure qdrant is ready
+
     logging.info(f"Starting streaming ingestion with batch size {batch_size}")
 
+    qdrant_cfg = config["qdrant"]
+    defer = qdrant_cfg.get("enabled", True) and qdrant_cfg.get("bulk", {}).get("defer_indexing", False)
+
     try:
-        asyncio.run(run_pipeline_async(dataset_path, batch_size, checkpoint_path, sleep_time, last_processed))
+        # full reloads: build the hnsw index once at the end instead of updating it on every upsert
+        with deferred_indexing(qdrant_cfg) if defer else contextlib.nullcontext():
+            asyncio.run(run_pipeline_async(
+                dataset_path, batch_size, checkpoint_path, file_fingerprint(dataset_path), start_offset
+            ))
     except KeyboardInterrupt:
         logging.warning("Pipeline interrupted by user.")
+    except Exception as e:
+        logging.error(f"Pipeline stopped, resume will restart from the last checkpoint: {e}")
     finally:
-        logging.info("Thread pool shut down.")
+        logging.info("Pipeline workers shut down.")
     
+    local_cfg = config.get("local_index", {})
+    if local_cfg.get("enabled", False) and local_cfg.get("build_hnsw", False):
+        build_hnsw_index(local_cfg)
+
+    # also after an interrupted run: whatever was written is already visible to searches
+    publish_collection_version()
+
     duration = time.time() - start_time
     logging.info(f"Pipeline finished in {duration/60:.1f} min")
+
+
+def run_bm25_build():
+    """ Builds the search server's BM25 index from the same filtered stream the pipeline embeds. """
+    start_time = time.time()
+    dataset_path = config["dataset"]["path"]
+    batch_size = config["openai"]["batch_size"]
+
+    papers = (paper for batch, _ in generate_batches(dataset_path, batch_size) for paper in batch)
+    build_bm25_index(papers, config.get("bm25", {}))
+
+    logging.info(f"BM25 build finished in {(time.time() - start_time)/60:.1f} min")
+
+
+def run_store_export():
+    """
+    Rebuilds the vector sinks (Qdrant and/or the local index) from the embedding store,
+    without any embedding API calls. Qdrant is loaded with bulk_load_qdrant (deferred
+    indexing, parallel uploads) and points carry the minimal payload; run the normal
+    pipeline instead (all store hits) when qdrant.payload is "display".
+    """
+    if embedding_store is None:
+        raise ValueError("embedding_store.enabled is false, nothing to export")
+
+    start_time = time.time()
+    batch_size = config.get("embedding_store", {}).get("export_batch_size", 10000)
+    qdrant_enabled = config["qdrant"].get("enabled", True)
+    local_cfg = config.get("local_index", {})
+    local_enabled = local_cfg.get("enabled", False)
+
+    total = embedding_store.count(provider.model_id)
+    logging.info(f"Exporting {total} stored {provider.model_id} vectors")
+
+    def chunks():
+        exported = 0
+        for paper_ids, vectors in embedding_store.iter_arrays(provider.model_id, batch_size):
+            if local_enabled:
+                store_vectors_local(
+                    [{"id": pid, "embedding": vector} for pid, vector in zip(paper_ids, vectors)], local_cfg
+                )
+            yield paper_ids, vectors
+            exported += len(paper_ids)
+            logging.info(f"Exported {exported}/{total} vectors")
+
+    if qdrant_enabled:
+        check_qdrant_collection(config["qdrant"])
+        bulk_load_qdrant(chunks(), config["qdrant"])
+    else:
+        for _ in chunks():
+            pass
+
+    if local_enabled and local_cfg.get("build_hnsw", False):
+        build_hnsw_index(local_cfg)
+
+    publish_collection_version()
+    logging.info(f"Export finished in {(time.time() - start_time)/60:.1f} min")
+
+
+def run_metadata_load():
+    """
+    Bulk-loads the metadata of every filtered paper into Supabase without embedding anything,
+    e.g. for a full snapshot. Papers are sent in `supabase.bulk_chunk_size` chunks by
+    `supabase.parallel` threads sharing one client (or the single Postgres connection).
+    """
+    start_time = time.time()
+    dataset_path = config["dataset"]["path"]
+    supabase_cfg = config["supabase"]
+    chunk_size = supabase_cfg.get("bulk_chunk_size", 5000)
+    parallel = supabase_cfg.get("parallel", 4)
+
+    loaded = 0
+    with ThreadPoolExecutor(max_workers=parallel) as pool:
+        pending = deque()
+        for batch, _ in generate_batches(dataset_path, chunk_size):
+            pending.append((pool.submit(store_metadata_supabase, batch, supabase_cfg), len(batch)))
+            # bounded window, so the parser can't run ahead of the uploads
+            while len(pending) >= parallel * 2 or (pending and pending[0][0].done()):
+                future, size = pending.popleft()
+                future.result()
+                loaded += size
+        for future, size in pending:
+            future.result()
+            loaded += size
+
+    publish_collection_version()
+    elapsed = time.time() - start_time
+    logging.info(f"Loaded metadata of {loaded} papers in {elapsed/60:.1f} min ({loaded / max(elapsed, 1e-9):.0f} rows/s)")
@@ -0,0 +1,165 @@
+import hashlib
+import logging
+import math
+import os
+import random
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from .ratelimit import RateLimiter, build_rate_limiter, estimate_tokens
+
+
+class EmbeddingProvider:
+    """
+    Turns a list of texts into one vector per text.
+    The search server (search/providers.py) must be configured with the same provider and
+    model, otherwise stored vectors and query vectors live in different spaces.
+    """
+    name = "base"
+
+    def __init__(self, model: str, dimension: Optional[int] = None):
+        self.model = model
+        self.dimension = dimension
+
+    @property
+    def model_id(self) -> str:
+        return f"{self.name}:{self.model}"
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        raise NotImplementedError
+
+    def is_transient(self, error: Exception) -> bool:
+        """ Whether a failed embed call is worth retrying. """
+        return False
+
+
+class OpenAIProvider(EmbeddingProvider):
+    """
+    OpenAI embeddings API. Every call waits on the shared rate limiter for request + token
+    budget and feeds the x-ratelimit-* headers back into it. The client's built-in retries
+    are disabled: the pipeline's `embed_batch` retries transient failures (see `is_transient`)
+    up to `advanced.max_retries` times with exponential backoff.
+    """
+    name = "openai"
+
+    def __init__(self, model: str, dimension: Optional[int] = None, limiter: Optional[RateLimiter] = None):
+        import openai
+
+        api_key = os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            raise ValueError("OPENAI_API_KEY not found.")
+
+        super().__init__(model, dimension)
+        self.client = openai.OpenAI(api_key=api_key, max_retries=0)
+        self.limiter = limiter
+        self._transient = (
+            openai.RateLimitError,
+            openai.APITimeoutError,
+            openai.APIConnectionError,
+            openai.InternalServerError,
+        )
+        self._rate_limit_error = openai.RateLimitError
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """ Calls the API once for a batch of texts. """
+        if self.limiter is None:
+            response = self.client.embeddings.create(model=self.model, input=texts)
+            return [d.embedding for d in sorted(response.data, key=lambda d: d.index)]
+
+        estimated = estimate_tokens(texts)
+        self.limiter.acquire(estimated)
+        try:
+            raw = self.client.embeddings.with_raw_response.create(model=self.model, input=texts)
+        except self._rate_limit_error as e:
+            self.limiter.release(estimated, headers=e.response.headers, rate_limited=True)
+            logging.warning(f"OpenAI rate limit hit, limiter backed off to {self.limiter.stats()}")
+            raise
+        except BaseException:
+            self.limiter.release(estimated)
+            raise
+
+        response = raw.parse()
+        self.limiter.release(estimated, used_tokens=response.usage.total_tokens, headers=raw.headers)
+        return [d.embedding for d in sorted(response.data, key=lambda d: d.index)]
+
+    def is_transient(self, error: Exception) -> bool:
+        return isinstance(error, self._transient)
+
+
+class LocalProvider(EmbeddingProvider):
+    """
+    In-process CPU embeddings with sentence-transformers (torch or ONNX Runtime backend).
+    Texts are split into `batch_size` chunks which are encoded in parallel on a thread pool.
+    """
+    name = "local"
+
+    def __init__(
+        self,
+        model: str,
+        backend: str = "torch",
+        batch_size: int = 64,
+        max_workers: int = 2,
+        dimension: Optional[int] = None,
+    ):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise RuntimeError("The local embedding provider requires the `sentence-transformers` package") from e
+
+        kwargs = {"backend": backend} if backend != "torch" else {}
+        self._model = SentenceTransformer(model, device="cpu", **kwargs)
+        super().__init__(model, dimension or self._model.get_sentence_embedding_dimension())
+        self.batch_size = batch_size
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="embed")
+        logging.info(f"Loaded local embedding model {model} ({backend}, dim {self.dimension})")
+
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        vectors = self._model.encode(texts, batch_size=self.batch_size, normalize_embeddings=True)
+        return vectors.tolist()
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        chunks = [texts[i : i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        return [vector for chunk in self._executor.map(self._encode, chunks) for vector in chunk]
+
+
+class FakeProvider(EmbeddingProvider):
+    """ Deterministic unit vectors derived from a hash of the text, for offline tests. """
+    name = "fake"
+
+    def __init__(self, model: str = "fake", dimension: int = 1536):
+        super().__init__(model, dimension)
+
+    def vector(self, text: str) -> List[float]:
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big")
+        rng = random.Random(seed)
+        values = [rng.gauss(0.0, 1.0) for _ in range(self.dimension)]
+        norm = math.sqrt(sum(v * v for v in values)) or 1.0
+        return [v / norm for v in values]
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        return [self.vector(text) for text in texts]
+
+
+def create_provider(config: Dict[str, Any]) -> EmbeddingProvider:
+    """ Builds the provider selected by `embedding.provider` in config.yaml. """
+    cfg = config.get("embedding", {})
+    provider = cfg.get("provider", "openai")
+    dimension = cfg.get("dimension") or config.get("qdrant", {}).get("vector_size")
+
+    if provider == "openai":
+        limiter = build_rate_limiter(
+            config["openai"].get("rate_limit", {}),
+            max_workers=config.get("advanced", {}).get("max_workers", 4),
+        )
+        return OpenAIProvider(config["openai"]["model"], dimension, limiter=limiter)
+    if provider == "local":
+        return LocalProvider(
+            cfg.get("local_model", "sentence-transformers/all-MiniLM-L6-v2"),
+            backend=cfg.get("local_backend", "torch"),
+            batch_size=cfg.get("local_batch_size", 64),
+            max_workers=cfg.get("local_workers", 2),
+            dimension=cfg.get("dimension"),
+        )
+    if provider == "fake":
+        return FakeProvider(dimension=dimension or 1536)
+    raise ValueError(f"Unknown embedding provider '{provider}'")
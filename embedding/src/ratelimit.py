@@ -0,0 +1,173 @@
+import math
+import re
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Iterable, Mapping, Optional
+
+# keep in sync with search/ratelimit.py, which is the asyncio version of the same limiter
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_reset(value: Optional[str]) -> float:
+    """ Parses OpenAI reset durations like "20ms", "1s", "6m0s" into seconds. """
+    if not value:
+        return 0.0
+    return sum(float(n) * _UNITS[unit] for n, unit in _DURATION_RE.findall(value))
+
+
+def parse_retry_after(value: Optional[str], default: float = 1.0) -> float:
+    """ Seconds to wait from a Retry-After header, either delay-seconds or an HTTP-date; `default` if unparseable. """
+    if not value:
+        return default
+    try:
+        seconds = float(value)
+        return max(seconds, 0.0) if math.isfinite(seconds) else default
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return default
+
+
+def estimate_tokens(texts: Iterable[str]) -> int:
+    """ Cheap upper-ish estimate, ~4 characters per token for English text. """
+    return sum(len(text) // 4 + 1 for text in texts)
+
+
+class TokenBucket:
+    """ Per-minute budget refilled continuously at limit / 60 per second. """
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.capacity / 60.0)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) * 60.0 / self.capacity
+
+    def take(self, amount: float, now: float):
+        self._refill(now)
+        self.level -= amount
+
+    def sync(self, limit: Optional[float], remaining: Optional[float], now: float):
+        """ Trusts the server: adopt its limit and never hold more budget than it reports left. """
+        self._refill(now)
+        if limit:
+            self.capacity = float(limit)
+        if remaining is not None:
+            self.level = min(self.level, float(remaining))
+
+
+class RateLimiter:
+    """
+    Thread-safe requests-per-minute + tokens-per-minute limiter for OpenAI embedding calls.
+
+    Budgets are token buckets corrected from the x-ratelimit-* response headers. In-flight
+    requests are capped by an adaptive concurrency limit: it grows by one slot per window of
+    successful calls and is halved on a 429, which also pauses all callers for retry-after.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float,
+        tokens_per_minute: float,
+        max_concurrency: int = 4,
+        min_concurrency: int = 1,
+    ):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.concurrency = float(max_concurrency)
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.rate_limited = 0
+        self._lock = threading.Lock()
+
+    def _wait_time(self, tokens: int, now: float) -> float:
+        return max(
+            self.paused_until - now,
+            self.requests.wait_time(1, now),
+            self.tokens.wait_time(tokens, now),
+        )
+
+    def acquire(self, tokens: int):
+        """ Blocks until there is request + token budget and a free concurrency slot. """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                wait = self._wait_time(tokens, now)
+                if wait <= 0 and self.in_flight < int(self.concurrency):
+                    self.requests.take(1, now)
+                    self.tokens.take(tokens, now)
+                    self.in_flight += 1
+                    return
+            time.sleep(max(wait, 0.01))  # otherwise waiting for a concurrency slot
+
+    def release(
+        self,
+        estimated_tokens: int = 0,
+        used_tokens: Optional[int] = None,
+        headers: Optional[Mapping[str, str]] = None,
+        rate_limited: bool = False,
+    ):
+        """ Returns the concurrency slot and feeds back actual usage and response headers. """
+        with self._lock:
+            self.in_flight -= 1
+            now = time.monotonic()
+
+            if used_tokens is not None:
+                # refund (or charge) the difference between the estimate and the real usage
+                self.tokens.take(used_tokens - estimated_tokens, now)
+            if headers is not None:
+                self._update_from_headers(headers, now)
+
+            if rate_limited:
+                self.rate_limited += 1
+                self.concurrency = max(self.min_concurrency, self.concurrency / 2)
+                retry_after = headers.get("retry-after") if headers is not None else None
+                self.paused_until = max(self.paused_until, now + parse_retry_after(retry_after))
+            else:
+                self.concurrency = min(self.max_concurrency, self.concurrency + 1 / self.concurrency)
+
+    def _update_from_headers(self, headers: Mapping[str, str], now: float):
+        def number(name):
+            value = headers.get(name)
+            try:
+                return float(value) if value is not None else None
+            except ValueError:
+                return None
+
+        self.requests.sync(number("x-ratelimit-limit-requests"), number("x-ratelimit-remaining-requests"), now)
+        self.tokens.sync(number("x-ratelimit-limit-tokens"), number("x-ratelimit-remaining-tokens"), now)
+
+        # out of budget: hold everyone until the window the server reported resets
+        if number("x-ratelimit-remaining-requests") == 0:
+            self.paused_until = max(self.paused_until, now + parse_reset(headers.get("x-ratelimit-reset-requests")))
+        if number("x-ratelimit-remaining-tokens") == 0:
+            self.paused_until = max(self.paused_until, now + parse_reset(headers.get("x-ratelimit-reset-tokens")))
+
+    def stats(self) -> str:
+        return f"concurrency={int(self.concurrency)} in_flight={self.in_flight} rate_limited={self.rate_limited}"
+
+
+def build_rate_limiter(cfg: Dict[str, Any], max_workers: int = 4) -> Optional[RateLimiter]:
+    """ Builds a RateLimiter from the `openai.rate_limit` config section, or None if disabled. """
+    if not cfg.get("enabled", True):
+        return None
+    return RateLimiter(
+        cfg.get("requests_per_minute", 3000),
+        cfg.get("tokens_per_minute", 1_000_000),
+        max_concurrency=cfg.get("max_concurrency", max_workers),
+    )
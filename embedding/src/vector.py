@@ -4,13 +4,42 @@ import logging
 import os
 import time
 import uuid
-from typing import Dict, Any, List
+from array import array
+from contextlib import contextmanager
+from typing import Dict, Any, Iterable, List, Tuple
+
+import numpy as np
 
 url = os.getenv("QDRANT_URL")
 api_key = os.getenv("QDRANT_API_KEY")
 
 client = QdrantClient(url=url, api_key=api_key)
 
+def quantization_config(config: Dict[str, Any]):
+    """
+    Maps `quantization` in the qdrant config section to a Qdrant quantization config.
+        none:   plain float32 vectors (~6 KB per 1536-d vector)
+        scalar: int8 vectors, 4x smaller
+        binary: 1 bit per dimension, 32x smaller, meant to be used with oversampling + rescoring
+    """
+    quantization = config.get("quantization", "none")
+    always_ram = config.get("quantization_always_ram", True)
+
+    if quantization == "scalar":
+        return models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(
+                type=models.ScalarType.INT8,
+                quantile=config.get("quantization_quantile", 0.99),
+                always_ram=always_ram,
+            )
+        )
+    if quantization == "binary":
+        return models.BinaryQuantization(binary=models.BinaryQuantizationConfig(always_ram=always_ram))
+    if quantization == "none":
+        return None
+    raise ValueError(f"Unknown quantization '{quantization}'")
+
+
 def check_qdrant_collection(config: Dict[str, Any]):
     collection_name = config.get("collection_name", "papers")
     vector_size = config.get("vector_size")
@@ -24,11 +53,20 @@ def check_qdrant_collection(config: Dict[str, Any]):
             return
         else:
             # create collection if missing
+            quantization = config.get("quantization", "none")
             client.create_collection(
                 collection_name=collection_name,
-                vectors_config=models.VectorParams(size=vector_size, distance=models.Distance.COSINE),
+                vectors_config=models.VectorParams(
+                    size=vector_size,
+                    distance=models.Distance.COSINE,
+                    # with quantization the originals are only read for rescoring, so they can live on disk
+                    on_disk=config.get("on_disk_vectors", quantization != "none"),
+                ),
+                quantization_config=quantization_config(config),
+            )
+            logging.info(
+                f"Created new collection '{collection_name}' with vector size {vector_size}, quantization {quantization}"
             )
-            logging.info(f"Created new collection '{collection_name}' with vector size {vector_size}")
     except Exception as e:
         logging.error(f"Error ensuring collection '{collection_name}': {e}")
         return
@@ -37,34 +75,175 @@ def check_qdrant_collection(config: Dict[str, Any]):
     time.sleep(sleep_time)
 
 
-def store_vectors_qdrant(embedding_results: List[Dict[str, Any]], config: Dict[str, Any]):
+def display_payload(paper: Dict[str, Any], abstract_max_chars: int = 500) -> Dict[str, Any]:
+    """ Compact display fields stored next to paper_id so search can skip the Supabase lookup. """
+    abstract = (paper.get("abstract") or "").strip()
+    if len(abstract) > abstract_max_chars:
+        abstract = abstract[:abstract_max_chars].rsplit(" ", 1)[0] + "..."
+
+    return {
+        "title": " ".join((paper.get("title") or "").split()),
+        "authors": paper.get("authors") or "",
+        "abstract": abstract,
+        "update_date": paper.get("update_date"),
+        "categories": paper.get("categories"),
+    }
+
+
+def point_id(paper_id: str) -> int:
+    """ Consistent uuid-derived integer id, shared with the search server. """
+    return uuid.uuid5(uuid.NAMESPACE_DNS, paper_id).int >> 64
+
+
+def store_vectors_qdrant(
+    embedding_results: List[Dict[str, Any]],
+    config: Dict[str, Any],
+    papers: List[Dict[str, Any]] | None = None,
+):
     """
-    Stores paper embeddings in a qdrant collection.
+    Stores paper embeddings in a qdrant collection. Raises if the upsert fails, so the
+    pipeline retries the batch instead of silently losing it.
 
     Args:
         embedding_results: List[Dict[str, Any]] with fields {"id": str, "embedding": List[float]}
         config: Dict[str, Any] from config.yaml or .env
+        papers: the paper dicts of the batch, used to build the display payload
+            when config["payload"] is "display"
     """
     collection_name = config.get("collection_name", "papers")
-    
-    points = []
+
+    papers_by_id = {}
+    if config.get("payload", "minimal") == "display" and papers:
+        papers_by_id = {p["id"]: p for p in papers}
+    abstract_max_chars = config.get("abstract_max_chars", 500)
+
+    ids, vectors, payloads = [], [], []
     for item in embedding_results:
         pid = item["id"]
-        # use consistent uuid integer id to satisfy qdrant
-        points.append(models.PointStruct(
-            id=uuid.uuid5(uuid.NAMESPACE_DNS, pid).int >> 64,
-            vector=item["embedding"], 
-            payload={"paper_id": pid}
-        ))
+        payload = {"paper_id": pid}
+        if pid in papers_by_id:
+            payload.update(display_payload(papers_by_id[pid], abstract_max_chars))
+        ids.append(point_id(pid))
+        vectors.append(item["embedding"])
+        payloads.append(payload)
+
+    # column-oriented batch instead of one PointStruct object per point
+    client.upsert(
+        collection_name=collection_name,
+        points=models.Batch(ids=ids, vectors=vectors, payloads=payloads),
+        wait=config.get("wait", True),
+    )
+    logging.info(f"Successfully inserted {len(ids)} vectors into '{collection_name}'")
+
+
+@contextmanager
+def deferred_indexing(config: Dict[str, Any]):
+    """
+    Turns HNSW indexing off for the duration of a bulk load and back on afterwards.
 
+    With indexing_threshold 0 qdrant only appends points to unindexed segments, which is
+    much faster than updating the graph on every upsert. Restoring the collection's own
+    threshold makes the optimizer build the index once over the loaded data; this waits until
+    the collection is green again (up to `index_timeout` seconds). `bulk.indexing_threshold`
+    is only used when the collection has no threshold of its own, or one of 0 left behind by
+    an interrupted load.
+    """
+    collection_name = config.get("collection_name", "papers")
+    bulk = config.get("bulk", {})
+
+    threshold = client.get_collection(collection_name).config.optimizer_config.indexing_threshold
+    if not threshold:
+        threshold = bulk.get("indexing_threshold", 20000)
+
+    client.update_collection(
+        collection_name=collection_name,
+        optimizers_config=models.OptimizersConfigDiff(indexing_threshold=0),
+    )
+    logging.info(f"Indexing disabled on '{collection_name}' for the bulk load")
     try:
-        client.upsert(
+        yield
+    finally:
+        # restored even if the load failed, otherwise the collection is left without an index
+        client.update_collection(
             collection_name=collection_name,
-            points=points,
+            optimizers_config=models.OptimizersConfigDiff(indexing_threshold=threshold),
         )
-        logging.info(f"Successfully inserted {len(points)} vectors into '{collection_name}'")
-    except Exception as e:
-        logging.error(f"Failed to upsert vectors.")
+        logging.info(f"Indexing threshold of '{collection_name}' restored to {threshold}")
+
+    start = time.time()
+    deadline = start + bulk.get("index_timeout", 3600)
+    while client.get_collection(collection_name).status != models.CollectionStatus.GREEN:
+        if time.time() > deadline:
+            logging.warning(f"'{collection_name}' is still indexing, search falls back to slower scans until it finishes")
+            return
+        time.sleep(2)
+    logging.info(f"Rebuilt the HNSW index of '{collection_name}' in {time.time() - start:.1f}s")
+
+
+def bulk_load_qdrant(batches: Iterable[Tuple[List[str], np.ndarray]], config: Dict[str, Any]) -> int:
+    """
+    High-throughput load of (paper ids, float32 matrix) chunks for full reloads.
+
+    Vectors stay in contiguous numpy arrays until upload_collection serializes them, which
+    uploads `bulk.batch_size` points per request from `bulk.parallel` processes without
+    waiting for each write to be applied. Indexing is deferred until everything is loaded.
+    Payloads are the minimal {"paper_id": ...}.
+
+    Returns the number of points loaded; raises if any of the uploaded points is missing from
+    the collection afterwards.
+    """
+    collection_name = config.get("collection_name", "papers")
+    bulk = config.get("bulk", {})
+    loaded = 0
+    uploaded = array("Q")  # point ids sent, to verify the load without counting pre-existing points
+    start = time.time()
+
+    with deferred_indexing(config):
+        for paper_ids, vectors in batches:
+            ids = [point_id(pid) for pid in paper_ids]
+            uploaded.extend(ids)
+            client.upload_collection(
+                collection_name=collection_name,
+                vectors=np.ascontiguousarray(vectors, dtype=np.float32),
+                ids=ids,
+                payload=({"paper_id": pid} for pid in paper_ids),
+                batch_size=bulk.get("batch_size", 256),
+                parallel=bulk.get("parallel", 4),
+                max_retries=bulk.get("max_retries", 3),
+                wait=False,
+            )
+            loaded += len(paper_ids)
+            elapsed = time.time() - start
+            logging.info(f"Bulk loaded {loaded} points into '{collection_name}' ({loaded / elapsed:.0f} points/s)")
+
+    elapsed = time.time() - start
+    logging.info(
+        f"Bulk load of {loaded} points finished in {elapsed:.1f}s including indexing "
+        f"({loaded / max(elapsed, 1e-9):.0f} points/s)"
+    )
+
+    # writes were not awaited, so check they all landed; give the last ones a moment to be applied.
+    # only the uploaded ids are counted, points the collection already held must not hide losses
+    expected = np.unique(np.frombuffer(uploaded, dtype=np.uint64)) if uploaded else np.empty(0, dtype=np.uint64)
+    deadline = time.time() + 30
+    count = _count_ids(collection_name, expected)
+    while count < len(expected) and time.time() < deadline:
+        time.sleep(1)
+        count = _count_ids(collection_name, expected)
+    if count < len(expected):
+        raise RuntimeError(
+            f"Bulk load into '{collection_name}' lost points: uploaded {len(expected)}, {count} of them are in the collection"
+        )
+    return loaded
 
-    
 
+def _count_ids(collection_name: str, ids: np.ndarray, chunk: int = 10000) -> int:
+    """ How many of the given point ids exist in the collection. """
+    return sum(
+        client.count(
+            collection_name,
+            count_filter=models.Filter(must=[models.HasIdCondition(has_id=ids[start : start + chunk].tolist())]),
+            exact=True,
+        ).count
+        for start in range(0, len(ids), chunk)
+    )
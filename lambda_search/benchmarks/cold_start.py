@@ -0,0 +1,123 @@
+"""
+measures lambda cold start: how long `import handler` takes, the latency of the first
+request in a fresh container, and warm request latency. every run is a new interpreter,
+like a new lambda container.
+
+usage (from lambda_search/, with config.yaml and the usual env vars):
+    python -m benchmarks.cold_start --runs 5
+    python -m benchmarks.cold_start --query "graph neural networks" --warm 20 --warmup-on-init
+    python -m benchmarks.cold_start --imports          # also list the slowest imports
+    python -m benchmarks.cold_start --output base.json
+    python -m benchmarks.cold_start --baseline base.json --max-regression 0.2   # exit 1 on regressions
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# runs inside the fresh interpreter and prints one json line
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+import handler
+import_ms = (time.perf_counter() - start) * 1000
+
+event = {"queryStringParameters": {"query": sys.argv[1]}}
+latencies, statuses = [], []
+for _ in range(int(sys.argv[2]) + 1):
+    start = time.perf_counter()
+    response = handler.lambda_handler(event, None)
+    latencies.append((time.perf_counter() - start) * 1000)
+    statuses.append(response["statusCode"])
+
+print(json.dumps({"import_ms": import_ms, "first_ms": latencies[0], "warm_ms": latencies[1:], "statuses": statuses}))
+"""
+
+METRICS = ("import_ms", "first_ms", "cold_total_ms", "warm_p50_ms")
+
+
+def run_once(query, warm, env, importtime):
+    cmd = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", CHILD, query, str(warm)]
+    proc = subprocess.run(cmd, capture_output=True, text=True, env=env)
+    if proc.returncode != 0:
+        raise RuntimeError(f"child failed:\n{proc.stderr}")
+    sample = json.loads(proc.stdout.strip().splitlines()[-1])
+    return sample, proc.stderr
+
+
+def slowest_imports(stderr, top=15):
+    """ parses `python -X importtime` output into the top modules by cumulative time. """
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative_us), int(self_us), name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def summarize(samples):
+    return {
+        "import_ms": statistics.median(s["import_ms"] for s in samples),
+        "first_ms": statistics.median(s["first_ms"] for s in samples),
+        "cold_total_ms": statistics.median(s["import_ms"] + s["first_ms"] for s in samples),
+        "warm_p50_ms": statistics.median(ms for s in samples for ms in s["warm_ms"]) if samples[0]["warm_ms"] else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters to start")
+    parser.add_argument("--warm", type=int, default=10, help="warm requests after the first one, per run")
+    parser.add_argument("--query", default="transformers for time series forecasting")
+    parser.add_argument("--warmup-on-init", action="store_true", help="set WARMUP_ON_INIT=1 in the children")
+    parser.add_argument("--imports", action="store_true", help="print the slowest imports of the last run")
+    parser.add_argument("--output", help="write the summary as json")
+    parser.add_argument("--baseline", help="summary json to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="allowed relative slowdown vs the baseline")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    if args.warmup_on_init:
+        env["WARMUP_ON_INIT"] = "1"
+
+    samples = []
+    stderr = ""
+    for i in range(args.runs):
+        sample, stderr = run_once(args.query, args.warm, env, args.imports and i == args.runs - 1)
+        samples.append(sample)
+        print(
+            f"run {i + 1}: import {sample['import_ms']:.0f}ms, first request {sample['first_ms']:.0f}ms, "
+            f"status {sample['statuses'][0]}"
+        )
+
+    summary = summarize(samples)
+    print(json.dumps(summary, indent=2))
+
+    if args.imports:
+        print(f"\n{'cumulative ms':>14} {'self ms':>9}  module")
+        for cumulative_us, self_us, name in slowest_imports(stderr):
+            print(f"{cumulative_us / 1000:>14.1f} {self_us / 1000:>9.1f}  {name}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(summary, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = [
+            f"{metric}: {baseline[metric]:.0f}ms -> {summary[metric]:.0f}ms"
+            for metric in METRICS
+            if baseline.get(metric) and summary[metric] > baseline[metric] * (1 + args.max_regression)
+        ]
+        if regressions:
+            print("\nregressions vs baseline:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print("\nno regressions vs baseline")
+
+
+if __name__ == "__main__":
+    main()
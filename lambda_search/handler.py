@@ -1,46 +1,134 @@
 import os
 import json
-import yaml
 import asyncio
+import base64
 import random
+import re
 import time
-import httpx
-from pydantic import BaseModel
-from qdrant_client import QdrantClient
-from qdrant_client.http.exceptions import UnexpectedResponse
-from openai import AsyncOpenAI, APIError, RateLimitError
+from urllib.parse import unquote
+
+import yaml
+
+from resilience import (
+    CircuitOpen,
+    DeadlineExceeded,
+    build_circuit_breakers,
+    build_deadline,
+    build_hedgers,
+    time_left,
+)
 
 # load config
 with open("config.yaml", "r") as f:
     config = yaml.safe_load(f)
 
-openai_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+TABLE_NAME = config["supabase"]["papers_table"]
+VERSIONS_TABLE = config["supabase"].get("versions_table", "collection_versions")
+RESULT_LIMIT = 10
+BATCH_MAX_QUERIES = config.get("batch_search", {}).get("max_queries", 50)
+resilience_cfg = config.get("resilience", {})
 
-qdrant = QdrantClient(
-    url=os.getenv("QDRANT_URL"),
-    api_key=os.getenv("QDRANT_API_KEY")
-)
+# the event loop lives for the lifetime of the container, so warm invocations reuse it and the
+# keep-alive connections of the clients bound to it
+loop = asyncio.new_event_loop()
+asyncio.set_event_loop(loop)
 
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_KEY")
-TABLE_NAME = config["supabase"]["papers_table"]
+# built by init() on first use. the sdks (openai, qdrant-client, httpx) take over a second to
+# import, which invocations that fail validation or only warm the container should not pay for
+clients = None
+provider = None
+search_params = None
+embedding_cache = None
+metadata_cache = None
+result_cache = None
+collection_version = None
+retry_exceptions = ()
+rate_limit_exceptions = ()
 
-retry_exceptions = (
-    TimeoutError,
-    ConnectionError,
-    httpx.ConnectError,
-    httpx.ReadTimeout,
-    APIError,
-    RateLimitError,
-    UnexpectedResponse,
-)
+# fields of the invocation being served, reset by lambda_handler
+invocation = {"request_id": None, "retries": 0, "hedges": 0}
 
-class SearchResult(BaseModel):
-    id: str
-    title: str
-    authors: str
-    abstract: str
-    score: float
+# one json object per line, so cloudwatch logs insights can filter and aggregate on the fields
+def log(level, message, **fields):
+    record = {"level": level, "message": message, "request_id": invocation["request_id"], **fields}
+    print(json.dumps(record, default=str))
+
+def init():
+    """ imports the sdks and builds clients, caches and provider once per container. """
+    global clients, provider, search_params, embedding_cache, metadata_cache, result_cache, collection_version
+    global retry_exceptions, rate_limit_exceptions
+    if clients is not None:
+        return
+
+    start = time.time()
+    import httpx
+    from qdrant_client.http.exceptions import ResponseHandlingException, UnexpectedResponse
+    from openai import APIError, RateLimitError
+    from cache import build_embedding_cache, build_metadata_cache, build_result_cache, CollectionVersion
+    from clients import create_clients, qdrant_search_params
+    from providers import create_provider
+    from ratelimit import build_rate_limiter, RateLimitTimeout
+
+    clients = create_clients(config)
+    rate_limiter = build_rate_limiter(config["openai"].get("rate_limit", {}))
+    provider = create_provider(config, clients.openai, rate_limiter)
+    search_params = qdrant_search_params(config)
+
+    # live for the lifetime of the container, so warm invocations share hits
+    embedding_cache = build_embedding_cache(config.get("cache", {}).get("embeddings", {}))
+    metadata_cache = build_metadata_cache(config.get("cache", {}).get("metadata", {}))
+    results_cfg = config.get("cache", {}).get("results", {})
+    result_cache = build_result_cache(results_cfg)
+    collection_version = CollectionVersion(
+        lambda: retry_async(fetch_collection_version, dependency="supabase"),
+        interval=results_cfg.get("version_check_interval", 30),
+        timeout=results_cfg.get("version_check_timeout", 1.0),
+    )
+
+    retry_exceptions = (
+        TimeoutError,
+        ConnectionError,
+        httpx.ConnectError,
+        httpx.ReadTimeout,
+        APIError,
+        RateLimitError,
+        UnexpectedResponse,
+        ResponseHandlingException,  # qdrant-client's wrapper for transport failures (refused, timed out)
+    )
+    rate_limit_exceptions = (RateLimitError, RateLimitTimeout)
+    log("INFO", "init", init_ms=round((time.time() - start) * 1000, 1))
+
+# opens the keep-alive connections (dns + tls) to every backend before the first query needs them
+async def prime_connections():
+    checks = {
+        "qdrant": clients.qdrant.get_collection(config["qdrant"]["collection_name"]),
+        "supabase": clients.supabase.get(f"/{TABLE_NAME}", params={"select": "id", "limit": 1}),
+    }
+    if provider.name == "openai":
+        checks["openai"] = clients.openai.models.retrieve(config["openai"]["model"])
+
+    start = time.time()
+    results = await asyncio.gather(*checks.values(), return_exceptions=True)
+    for name, result in zip(checks, results):
+        if isinstance(result, Exception):
+            log("WARN", "warmup failed", backend=name, error=result)
+    log("INFO", "warmup", warmup_ms=round((time.time() - start) * 1000, 1))
+
+def warmup():
+    init()
+    loop.run_until_complete(prime_connections())
+
+def circuit_changed(dependency, state):
+    log("WARN", "circuit breaker", dependency=dependency, state=state)
+
+def hedge_sent(operation, won):
+    invocation["hedges"] += 1
+
+# breakers and hedge latencies live for the lifetime of the container, like the caches
+breakers = build_circuit_breakers(
+    resilience_cfg.get("circuit_breaker", {}), ["openai", "qdrant", "supabase"], on_change=circuit_changed
+)
+hedgers = build_hedgers(resilience_cfg.get("hedging", {}), ["qdrant", "supabase"], on_hedge=hedge_sent)
 
 # exceptions
 class SearchError(Exception):
@@ -61,119 +149,477 @@ class ExternalServiceError(SearchError):
 class RateLimitExceeded(SearchError):
     status_code = 429
 
+class ServiceUnavailableError(SearchError):
+    status_code = 503
+
 # fetch metadata from Supabase
 async def fetch_metadata(paper_ids):
     ids_filter = ",".join(paper_ids)
-    url = f"{SUPABASE_URL}/rest/v1/{TABLE_NAME}?id=in.({ids_filter})&select=id,title,authors,abstract"
-    headers = {
-        "apikey": SUPABASE_KEY,
-        "Authorization": f"Bearer {SUPABASE_KEY}",
-        "Content-Type": "application/json",
-        "Accept": "application/json",
-    }
-    async with httpx.AsyncClient() as client:
-        resp = await client.get(url, headers=headers, timeout=10.0)
-        resp.raise_for_status()
-        return resp.json()
+    resp = await clients.supabase.get(
+        f"/{TABLE_NAME}",
+        params={"id": f"in.({ids_filter})", "select": "id,title,authors,abstract"},
+    )
+    resp.raise_for_status()
+    return resp.json()
+
+# version marker the embedding pipeline bumps after every run; part of every result cache key
+async def fetch_collection_version():
+    resp = await clients.supabase.get(
+        f"/{VERSIONS_TABLE}",
+        params={"collection": f"eq.{config['qdrant']['collection_name']}", "select": "version"},
+    )
+    resp.raise_for_status()
+    rows = resp.json()
+    return rows[0]["version"] if rows else "0"
+
+def is_transient(error):
+    from clients import TRANSIENT_GRPC_CODES, grpc_status
 
-# retry helper
-async def retry_async(func, *args, **kwargs):
+    return isinstance(error, retry_exceptions) or grpc_status(error) in TRANSIENT_GRPC_CODES
+
+# retry helper: retries only while the current stage has budget left for the next attempt.
+# `dependency` selects the circuit breaker, `hedge` marks an idempotent read that may be sent twice
+async def retry_async(func, *args, dependency=None, hedge=False, **kwargs):
     max_retries = config.get("max_retries", 3)
     base_delay = config.get("base_delay", 0.5)
+    breaker = breakers.get(dependency)
+    hedger = hedgers.get(dependency) if hedge else None
+
+    async def call():
+        if asyncio.iscoroutinefunction(func):
+            return await func(*args, **kwargs)
+        return await asyncio.to_thread(func, *args, **kwargs)
+
     for attempt in range(max_retries):
         try:
-            if asyncio.iscoroutinefunction(func):
-                return await func(*args, **kwargs)
-            else:
-                return await asyncio.to_thread(func, *args, **kwargs)
-        except RateLimitError as e:
+            if breaker is not None:
+                breaker.before_call()
+            result = await (hedger.call(call) if hedger is not None else call())
+        except CircuitOpen as e:
+            raise ServiceUnavailableError(str(e)) from e
+        except rate_limit_exceptions as e:
+            if breaker is not None:
+                breaker.record_cancelled()
             raise RateLimitExceeded(f"Rate limit exceeded: {e}") from e
+        except asyncio.CancelledError:
+            if breaker is not None:
+                # cut off by the stage deadline (timers may fire a hair early): a hanging dependency counts as failing
+                left = time_left()
+                if left is not None and left < 0.01:
+                    breaker.record_failure()
+                else:
+                    breaker.record_cancelled()
+            raise
         except Exception as e:
-            if attempt == max_retries - 1 or not isinstance(e, retry_exceptions):
-                raise ExternalServiceError(f"{func.__name__} failed after {max_retries} retries: {e}") from e
+            transient = is_transient(e)
+            if breaker is not None:
+                if transient:
+                    breaker.record_failure()
+                else:
+                    breaker.record_cancelled()
+            if attempt == max_retries - 1 or not transient:
+                raise ExternalServiceError(f"{func.__name__} failed after {attempt + 1} attempts: {e}") from e
             delay = base_delay * (2 ** attempt) + random.uniform(0, 0.1)
-            print(f"[WARN] Attempt {attempt+1}/{max_retries} failed for {func.__name__}: {e}. Retrying in {delay:.2f}s...")
+            left = time_left()
+            if left is not None and delay >= left:
+                raise ExternalServiceError(
+                    f"{func.__name__} failed after {attempt + 1} attempts, no time left to retry: {e}"
+                ) from e
+            invocation["retries"] += 1
+            log(
+                "WARN", "retrying", operation=func.__name__, attempt=attempt + 1, max_retries=max_retries,
+                delay_s=round(delay, 2), error=e,
+            )
             await asyncio.sleep(delay)
+        else:
+            if breaker is not None:
+                breaker.record_success()
+            return result
 
-# search
-async def perform_search(query: str) -> list[SearchResult]:
-    if not query or len(query) < 3:
-        raise BadRequestError("Query must be at least 3 characters.")
+# embed a query, going through the embedding cache when it is enabled
+async def embed_query(query):
+    model = provider.model_id
+
+    if embedding_cache is not None:
+        vector = await embedding_cache.get(query, model)
+        if vector is not None:
+            return vector, True
+
+    vector = (await retry_async(provider.embed, [query], dependency=provider.name))[0]
+
+    if embedding_cache is not None:
+        await embedding_cache.set(query, model, vector)
+    return vector, False
+
+# vectors for a list of queries: embedding cache hits are reused and all misses go to the provider
+# in one call. returns (vectors, number of cache hits)
+async def embed_queries(queries):
+    model = provider.model_id
+    vectors = {}
+    if embedding_cache is not None:
+        cached = await asyncio.gather(*(embedding_cache.get(query, model) for query in queries))
+        vectors = {query: vector for query, vector in zip(queries, cached) if vector is not None}
+
+    missing = [query for query in queries if query not in vectors]
+    if missing:
+        embedded = await retry_async(provider.embed, missing, dependency=provider.name)
+        vectors.update(zip(missing, embedded))
+        if embedding_cache is not None:
+            await asyncio.gather(*(embedding_cache.set(query, model, vector) for query, vector in zip(missing, embedded)))
+    return [vectors[query] for query in queries], len(queries) - len(missing)
 
+# metadata for paper_ids in the given order; only cache misses are fetched, in one batched request
+async def get_metadata(paper_ids, hedge=True):
+    if metadata_cache is None:
+        return await retry_async(fetch_metadata, paper_ids, dependency="supabase", hedge=hedge)
+
+    found, missing = metadata_cache.get_many(paper_ids)
+    if missing:
+        rows = await retry_async(fetch_metadata, missing, dependency="supabase", hedge=hedge)
+        metadata_cache.set_many(rows)
+        found.update({row["id"]: row for row in rows})
+
+    return [found[pid] for pid in paper_ids if pid in found]
+
+DISPLAY_FIELDS = ("title", "authors", "abstract")
+
+# {paper_id: metadata}. with qdrant.metadata_source: payload the display fields come straight from the
+# qdrant payload, and supabase is only queried for papers whose payload is missing some of them
+async def resolve_metadata(results, paper_ids, hedge=True):
+    metadata_map = {}
+    if config["qdrant"].get("metadata_source", "supabase") == "payload":
+        for res in results:
+            if all(field in res.payload for field in DISPLAY_FIELDS):
+                metadata_map[res.payload["paper_id"]] = res.payload
+
+    missing = [pid for pid in paper_ids if pid not in metadata_map]
+    if missing:
+        metadata_map.update({p["id"]: p for p in await get_metadata(missing, hedge=hedge)})
+    return metadata_map
+
+# search results in score order, joined with their metadata; results without metadata are dropped
+def merge_results(results, metadata_map):
+    combined_results = []
+    for res in results:
+        pid = res.payload.get("paper_id")
+        if not pid or pid not in metadata_map:
+            continue
+        meta = metadata_map[pid]
+        combined_results.append({
+            "id": pid,
+            "title": meta.get("title") or "",
+            "authors": meta.get("authors") or "",
+            "abstract": meta.get("abstract") or "",
+            "score": float(res.score),
+        })
+    return combined_results
+
+def log_search(timings, cache_hit, result_count, message="search"):
+    fields = {f"{stage}_ms": round(seconds * 1000, 1) for stage, seconds in timings.items()}
+    if embedding_cache is not None:
+        fields["embedding_cache"] = "hit" if cache_hit else "miss"
+        fields["embedding_cache_hits"] = embedding_cache.hits
+        fields["embedding_cache_misses"] = embedding_cache.misses
+    if metadata_cache is not None:
+        fields["metadata_cache_hits"] = metadata_cache.hits
+        fields["metadata_cache_misses"] = metadata_cache.misses
+    log("INFO", message, retries=invocation["retries"], hedges=invocation["hedges"], results=result_count, **fields)
+
+# search; `message` tags the log line, so background refreshes are not counted as searches
+async def perform_search(query: str, message="search") -> list[dict]:
     start_total = time.time()
+    # every stage runs within its share of the invocation's time budget
+    deadline = build_deadline(resilience_cfg.get("deadline", {}))
 
     # embeddings
     start_openai = time.time()
-    response = await retry_async(
-        openai_client.embeddings.create,
-        model=config["openai"]["model"],
-        input=query
-    )
-    vector = response.data[0].embedding
+    vector, cache_hit = await deadline.run("embed", embed_query(query))
     openai_time = time.time() - start_openai
 
     # qdrant search
     start_qdrant = time.time()
-    results = await retry_async(
-        qdrant.search,
+    results = await deadline.run("vector", retry_async(
+        clients.qdrant.search,
         collection_name=config["qdrant"]["collection_name"],
         query_vector=vector,
-        limit=10,
-        with_payload=True
-    )
+        search_params=search_params,
+        limit=RESULT_LIMIT,
+        with_payload=True,
+        dependency="qdrant",
+        hedge=True,
+    ))
     qdrant_time = time.time() - start_qdrant
 
     paper_ids = [res.payload.get("paper_id") for res in results if res.payload.get("paper_id")]
 
     if not paper_ids:
         total_time = time.time() - start_total
-        print(f"[TIMING] OpenAI: {openai_time:.2f}s, Qdrant: {qdrant_time:.2f}s, Metadata: 0.00s, Total: {total_time:.2f}s")
+        log_search({"embed": openai_time, "vector": qdrant_time, "metadata": 0.0, "total": total_time}, cache_hit, 0, message)
         raise NotFoundError("No papers found for this query.")
 
     # fetch metadata
     start_supabase = time.time()
-    metadata_list = await retry_async(fetch_metadata, paper_ids)
+    metadata_map = await deadline.run("metadata", resolve_metadata(results, paper_ids))
     supabase_time = time.time() - start_supabase
 
-    metadata_map = {p["id"]: p for p in metadata_list}
+    combined_results = merge_results(results, metadata_map)
 
-    combined_results = []
-    for res in results:
-        pid = res.payload.get("paper_id")
-        if not pid or pid not in metadata_map:
-            continue
-        meta = metadata_map[pid]
-        combined_results.append(
-            SearchResult(
-                id=pid,
-                title=meta.get("title", ""),
-                authors=meta.get("authors", ""),
-                abstract=meta.get("abstract", ""),
-                score=res.score
-            )
+    total_time = time.time() - start_total
+    log_search(
+        {"embed": openai_time, "vector": qdrant_time, "metadata": supabase_time, "total": total_time},
+        cache_hit,
+        len(combined_results),
+        message,
+    )
+
+    return combined_results
+
+# many queries at one round trip per stage: one embedding call, one qdrant search_batch and one
+# metadata fetch for the union of the papers found. returns {query: results}
+async def perform_batch_search(queries: list[str]) -> dict:
+    from qdrant_client.http import models
+
+    start_total = time.time()
+    deadline = build_deadline(resilience_cfg.get("deadline", {}))
+
+    start_openai = time.time()
+    vectors, cache_hits = await deadline.run("embed", embed_queries(queries))
+    openai_time = time.time() - start_openai
+
+    # not hedged: batches are large and their latencies would skew the hedge delay of single searches
+    start_qdrant = time.time()
+    batch_results = await deadline.run("vector", retry_async(
+        clients.qdrant.search_batch,
+        collection_name=config["qdrant"]["collection_name"],
+        requests=[
+            models.SearchRequest(vector=vector, params=search_params, limit=RESULT_LIMIT, with_payload=True)
+            for vector in vectors
+        ],
+        dependency="qdrant",
+    ))
+    qdrant_time = time.time() - start_qdrant
+
+    # one metadata fetch for every paper in the batch, however many queries found it
+    all_results = [res for results in batch_results for res in results]
+    paper_ids = list(dict.fromkeys(res.payload.get("paper_id") for res in all_results if res.payload.get("paper_id")))
+    start_supabase = time.time()
+    metadata_map = {}
+    if paper_ids:
+        metadata_map = await deadline.run("metadata", resolve_metadata(all_results, paper_ids, hedge=False))
+    supabase_time = time.time() - start_supabase
+
+    results = {query: merge_results(res, metadata_map) for query, res in zip(queries, batch_results)}
+    log(
+        "INFO", "batch search", queries=len(queries), papers=len(paper_ids), embedding_cache_hits=cache_hits,
+        retries=invocation["retries"], embed_ms=round(openai_time * 1000, 1), vector_ms=round(qdrant_time * 1000, 1),
+        metadata_ms=round(supabase_time * 1000, 1), total_ms=round((time.time() - start_total) * 1000, 1),
+    )
+    return results
+
+# [{"query", "results"}] for the queries of a batch request, in request order
+async def batch_search_response(queries):
+    if not isinstance(queries, list) or not queries:
+        raise BadRequestError("queries must be a non-empty list.")
+    if len(queries) > BATCH_MAX_QUERIES:
+        raise BadRequestError(f"A batch can have at most {BATCH_MAX_QUERIES} queries.")
+    if any(not isinstance(query, str) or len(query) < 3 for query in queries):
+        raise BadRequestError("Every query must be at least 3 characters.")
+
+    init()
+    from cache import normalize_query
+
+    # queries that only differ in case or whitespace are searched once
+    distinct = {}
+    for query in queries:
+        distinct.setdefault(normalize_query(query), query)
+
+    results = await perform_batch_search(list(distinct.values()))
+    return [{"query": query, "results": results[distinct[normalize_query(query)]]} for query in queries]
+
+# qdrant recommendations from the stored vector of a paper, which they exclude; None if the paper has no point.
+# a missing point is an answer, not a failure, so it must not be retried or trip the circuit breaker
+async def recommend_points(paper_id, limit):
+    import grpc
+    from qdrant_client.http.exceptions import UnexpectedResponse
+    from clients import grpc_status, point_id
+
+    try:
+        return await clients.qdrant.recommend(
+            collection_name=config["qdrant"]["collection_name"],
+            positive=[point_id(paper_id)],
+            search_params=search_params,
+            limit=limit,
+            with_payload=True,
         )
+    except UnexpectedResponse as e:
+        if e.status_code == 404:
+            return None
+        raise
+    except grpc.RpcError as e:
+        # qdrant.prefer_grpc: the same answer arrives as a NOT_FOUND status
+        if grpc_status(e) == grpc.StatusCode.NOT_FOUND:
+            return None
+        raise
 
-    total_time = time.time() - start_total
-    print(f"[TIMING] OpenAI: {openai_time:.2f}s, Qdrant: {qdrant_time:.2f}s, Metadata: {supabase_time:.2f}s, Total: {total_time:.2f}s")
+# "more like this": vector neighbours of a paper from its stored vector, so no embedding call
+async def perform_similar(paper_id: str) -> list[dict]:
+    init()
+    start_total = time.time()
+    deadline = build_deadline(resilience_cfg.get("deadline", {}))
+
+    start_qdrant = time.time()
+    results = await deadline.run(
+        "vector", retry_async(recommend_points, paper_id, RESULT_LIMIT, dependency="qdrant", hedge=True)
+    )
+    qdrant_time = time.time() - start_qdrant
+    if results is None:
+        raise NotFoundError(f"Paper {paper_id} is not indexed.")
+
+    # the source paper is excluded by id, this also drops duplicate points of the same paper
+    results = [res for res in results if res.payload.get("paper_id") != paper_id]
+    paper_ids = [res.payload.get("paper_id") for res in results if res.payload.get("paper_id")]
+    if not paper_ids:
+        raise NotFoundError(f"No papers similar to {paper_id} found.")
+
+    start_supabase = time.time()
+    metadata_map = await deadline.run("metadata", resolve_metadata(results, paper_ids))
+    supabase_time = time.time() - start_supabase
 
+    combined_results = merge_results(results, metadata_map)
+    log(
+        "INFO", "similar", paper_id=paper_id, retries=invocation["retries"], hedges=invocation["hedges"],
+        results=len(combined_results), vector_ms=round(qdrant_time * 1000, 1),
+        metadata_ms=round(supabase_time * 1000, 1), total_ms=round((time.time() - start_total) * 1000, 1),
+    )
     return combined_results
 
+# stale result cache entries are recomputed in the background. the container is frozen between
+# invocations, so a refresh runs on the persistent loop alongside the next invocation
+refreshing = {}  # cache key -> refresh task
+
+async def refresh_result(key, query):
+    try:
+        await result_cache.set(key, await perform_search(query, message="refresh"))
+    except Exception as e:
+        log("WARN", "background refresh failed", query=query, error=e)
+    finally:
+        refreshing.pop(key, None)
+
+def schedule_refresh(key, query):
+    if key not in refreshing:
+        refreshing[key] = loop.create_task(refresh_result(key, query))
+
+# (status code, results, headers) for a query, through the result cache when it is enabled
+async def search_response(query: str, if_none_match=None):
+    if not query or len(query) < 3:
+        raise BadRequestError("Query must be at least 3 characters.")
+
+    init()
+
+    if result_cache is None:
+        return 200, await perform_search(query), {}
+
+    from cache import etag_matches
+
+    start = time.time()
+    key = result_cache.key(query, RESULT_LIMIT, None, await collection_version.get())
+    entry, fresh = await result_cache.get(key)
+    if entry is None:
+        state = "miss"
+        entry = await result_cache.set(key, await perform_search(query))
+    else:
+        state = "hit" if fresh else "stale"
+        if not fresh:
+            schedule_refresh(key, query)
+        log(
+            "INFO", "search", result_cache=state, retries=0, results=len(entry["results"]),
+            total_ms=round((time.time() - start) * 1000, 1),
+        )
+
+    headers = {
+        "ETag": entry["etag"],
+        "Cache-Control": result_cache.cache_control(entry),
+        "X-Cache": state.upper(),
+    }
+    if etag_matches(if_none_match, entry["etag"]):
+        return 304, None, headers
+    return 200, entry["results"], headers
+
+# body of a POST /search/batch through api gateway, or the event itself when invoked directly
+# with {"queries": [...]}; None for any other request
+def batch_request(event):
+    if "queries" in event:
+        return event
+    method = event.get("httpMethod") or (event.get("requestContext") or {}).get("http", {}).get("method")
+    path = event.get("rawPath") or event.get("path") or ""
+    if method != "POST" or not path.rstrip("/").endswith("/search/batch"):
+        return None
+
+    body = event.get("body") or ""
+    if event.get("isBase64Encoded"):
+        body = base64.b64decode(body).decode("utf-8")
+    try:
+        request = json.loads(body) if body else {}
+    except ValueError:
+        raise BadRequestError("Request body must be json.")
+    if not isinstance(request, dict):
+        raise BadRequestError('Request body must be a json object like {"queries": [...]}.')
+    return request
+
+# old-style arxiv ids contain a slash (hep-th/9901001), so the id is everything between the two segments
+SIMILAR_PATH = re.compile(r"/papers/(.+)/similar/?$")
+
+# paper id of a GET /papers/{id}/similar through api gateway, None for any other request
+def similar_request(event):
+    path = event.get("rawPath") or event.get("path") or ""
+    match = SIMILAR_PATH.search(path)
+    return unquote(match.group(1)) if match else None
+
+def request_header(event, name):
+    headers = event.get("headers") or {}
+    return next((value for key, value in headers.items() if key.lower() == name), None)
+
 # lambda handler
 def lambda_handler(event, context):
+    invocation.update(request_id=getattr(context, "aws_request_id", None), retries=0, hedges=0)
     try:
-        query = event.get("queryStringParameters", {}).get("query")
+        # scheduled keep-warm ping, e.g. an eventbridge rule sending {"warmup": true}
+        if event.get("warmup"):
+            warmup()
+            return {"statusCode": 200, "body": json.dumps({"warm": True})}
+
+        batch = batch_request(event)
+        if batch is not None:
+            results = loop.run_until_complete(batch_search_response(batch.get("queries")))
+            return {"statusCode": 200, "body": json.dumps(results)}
+
+        paper_id = similar_request(event)
+        if paper_id is not None:
+            results = loop.run_until_complete(perform_similar(paper_id))
+            return {"statusCode": 200, "body": json.dumps(results)}
+
+        query = (event.get("queryStringParameters") or {}).get("query")
         if not query:
             raise BadRequestError("Missing query parameter")
 
-        results = asyncio.run(perform_search(query))
-        results_json = [r.dict() for r in results]
+        status, results, headers = loop.run_until_complete(
+            search_response(query, request_header(event, "if-none-match"))
+        )
+        return {"statusCode": status, "headers": headers, "body": json.dumps(results) if results is not None else ""}
 
-        return {"statusCode": 200, "body": json.dumps(results_json)}
+    except DeadlineExceeded as e:
+        log("ERROR", str(e), status=504, retries=invocation["retries"])
+        return {"statusCode": 504, "body": json.dumps({"error": str(e)})}
 
     except SearchError as e:
-        print(f"[ERROR] {e.message}")
+        log("ERROR", e.message, status=e.status_code, retries=invocation["retries"])
         return {"statusCode": e.status_code, "body": json.dumps({"error": e.message})}
 
     except Exception as e:
-        print(f"[ERROR] {e}")
+        log("ERROR", str(e), status=500, error_type=type(e).__name__, retries=invocation["retries"])
         return {"statusCode": 500, "body": json.dumps({"error": "Internal server error"})}
+
+# with provisioned concurrency or snapstart, pay for imports and connection setup during init
+# rather than in the first request
+if os.getenv("WARMUP_ON_INIT", "").lower() in ("1", "true", "yes"):
+    warmup()
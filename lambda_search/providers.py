@@ -0,0 +1,149 @@
+import asyncio
+import hashlib
+import math
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+from openai import RateLimitError
+
+from ratelimit import estimate_tokens
+
+
+class EmbeddingProvider:
+    """
+    turns a list of texts into one vector per text.
+    ingestion (embedding/src/providers.py) and search must be configured with the same
+    provider and model, otherwise query vectors are not comparable with the stored ones.
+    """
+    name = "base"
+
+    def __init__(self, model, dimension=None):
+        self.model = model
+        self.dimension = dimension
+
+    @property
+    def model_id(self) -> str:
+        """ identifies the vector space, e.g. for cache keys. """
+        return f"{self.name}:{self.model}"
+
+    async def embed(self, texts):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class OpenAIProvider(EmbeddingProvider):
+    """
+    openai embeddings api. with a rate limiter, every call first waits (up to `max_wait`
+    seconds) for request + token budget, and feeds the x-ratelimit-* headers back into it.
+    """
+    name = "openai"
+
+    def __init__(self, client, model, dimension=None, limiter=None, max_wait=None):
+        super().__init__(model, dimension)
+        self.client = client
+        self.limiter = limiter
+        self.max_wait = max_wait
+
+    async def embed(self, texts):
+        if self.limiter is None:
+            response = await self.client.embeddings.create(model=self.model, input=texts)
+            return [d.embedding for d in sorted(response.data, key=lambda d: d.index)]
+
+        estimated = estimate_tokens(texts)
+        await self.limiter.acquire(estimated, timeout=self.max_wait)
+        try:
+            raw = await self.client.embeddings.with_raw_response.create(model=self.model, input=texts)
+        except RateLimitError as e:
+            self.limiter.release(estimated, headers=e.response.headers, rate_limited=True)
+            raise
+        except BaseException:
+            self.limiter.release(estimated)
+            raise
+
+        response = raw.parse()
+        self.limiter.release(estimated, used_tokens=response.usage.total_tokens, headers=raw.headers)
+        return [d.embedding for d in sorted(response.data, key=lambda d: d.index)]
+
+
+class LocalProvider(EmbeddingProvider):
+    """
+    in-process cpu embeddings with sentence-transformers (torch or onnx runtime backend).
+    texts are split into `batch_size` chunks which are encoded on a dedicated thread pool,
+    so the event loop and the default executor stay free.
+    """
+    name = "local"
+
+    def __init__(self, model, backend="torch", batch_size=64, max_workers=2, dimension=None):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise RuntimeError("the local embedding provider requires the `sentence-transformers` package") from e
+
+        kwargs = {"backend": backend} if backend != "torch" else {}
+        self._model = SentenceTransformer(model, device="cpu", **kwargs)
+        super().__init__(model, dimension or self._model.get_sentence_embedding_dimension())
+        self.batch_size = batch_size
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="embed")
+
+    def _encode(self, texts):
+        vectors = self._model.encode(texts, batch_size=self.batch_size, normalize_embeddings=True)
+        return vectors.tolist()
+
+    async def embed(self, texts):
+        loop = asyncio.get_running_loop()
+        chunks = [texts[i : i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        results = await asyncio.gather(
+            *(loop.run_in_executor(self._executor, self._encode, chunk) for chunk in chunks)
+        )
+        return [vector for chunk in results for vector in chunk]
+
+    async def close(self):
+        self._executor.shutdown(wait=False)
+
+
+class FakeProvider(EmbeddingProvider):
+    """ deterministic unit vectors derived from a hash of the text, for offline tests. """
+    name = "fake"
+
+    def __init__(self, model="fake", dimension=1536):
+        super().__init__(model, dimension)
+
+    def vector(self, text):
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big")
+        rng = random.Random(seed)
+        values = [rng.gauss(0.0, 1.0) for _ in range(self.dimension)]
+        norm = math.sqrt(sum(v * v for v in values)) or 1.0
+        return [v / norm for v in values]
+
+    async def embed(self, texts):
+        return [self.vector(text) for text in texts]
+
+
+def create_provider(config, openai_client=None, limiter=None) -> EmbeddingProvider:
+    """ builds the provider selected by `embedding.provider` in config.yaml. """
+    cfg = config.get("embedding", {})
+    provider = cfg.get("provider", "openai")
+    dimension = cfg.get("dimension")
+
+    if provider == "openai":
+        max_wait = config["openai"].get("rate_limit", {}).get("max_wait_ms")
+        return OpenAIProvider(
+            openai_client,
+            config["openai"]["model"],
+            dimension,
+            limiter=limiter,
+            max_wait=max_wait / 1000 if max_wait is not None else None,
+        )
+    if provider == "local":
+        return LocalProvider(
+            cfg.get("local_model", "sentence-transformers/all-MiniLM-L6-v2"),
+            backend=cfg.get("local_backend", "torch"),
+            batch_size=cfg.get("local_batch_size", 64),
+            max_workers=cfg.get("local_workers", 2),
+            dimension=dimension,
+        )
+    if provider == "fake":
+        return FakeProvider(dimension=dimension or 1536)
+    raise ValueError(f"Unknown embedding provider '{provider}'")
@@ -0,0 +1,167 @@
+import asyncio
+import math
+import re
+import time
+from email.utils import parsedate_to_datetime
+
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+class RateLimitTimeout(Exception):
+    """ raised when budget would not be available within the caller's max wait. """
+
+
+def parse_reset(value) -> float:
+    """ parses openai reset durations like "20ms", "1s", "6m0s" into seconds. """
+    if not value:
+        return 0.0
+    return sum(float(n) * _UNITS[unit] for n, unit in _DURATION_RE.findall(value))
+
+
+def parse_retry_after(value, default=1.0) -> float:
+    """ seconds to wait from a Retry-After header, either delay-seconds or an http-date; `default` if unparseable. """
+    if not value:
+        return default
+    try:
+        seconds = float(value)
+        return max(seconds, 0.0) if math.isfinite(seconds) else default
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return default
+
+
+def estimate_tokens(texts) -> int:
+    """ cheap upper-ish estimate, ~4 characters per token for english text. """
+    return sum(len(text) // 4 + 1 for text in texts)
+
+
+class TokenBucket:
+    """ per-minute budget refilled continuously at limit / 60 per second. """
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.capacity / 60.0)
+        self.updated = now
+
+    def wait_time(self, amount, now) -> float:
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) * 60.0 / self.capacity
+
+    def take(self, amount, now):
+        self._refill(now)
+        self.level -= amount
+
+    def sync(self, limit, remaining, now):
+        """ trust the server: adopt its limit and never hold more budget than it reports left. """
+        self._refill(now)
+        if limit:
+            self.capacity = float(limit)
+        if remaining is not None:
+            self.level = min(self.level, float(remaining))
+
+
+class AsyncRateLimiter:
+    """
+    shared requests-per-minute + tokens-per-minute limiter for openai calls.
+
+    budgets are token buckets corrected from the x-ratelimit-* response headers. in-flight
+    requests are capped by an adaptive concurrency limit (additive increase on success,
+    halved on a 429), so callers run close to quota without 429 storms.
+    """
+
+    def __init__(self, requests_per_minute, tokens_per_minute, max_concurrency=8, min_concurrency=1):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.concurrency = float(max_concurrency)
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.throttled = 0
+
+    def _wait_time(self, tokens, now) -> float:
+        return max(
+            self.paused_until - now,
+            self.requests.wait_time(1, now),
+            self.tokens.wait_time(tokens, now),
+        )
+
+    async def acquire(self, tokens, timeout=None):
+        """ waits for budget and a concurrency slot; raises RateLimitTimeout after `timeout` seconds. """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            now = time.monotonic()
+            wait = self._wait_time(tokens, now)
+            if wait <= 0 and self.in_flight < int(self.concurrency):
+                self.requests.take(1, now)
+                self.tokens.take(tokens, now)
+                self.in_flight += 1
+                return
+
+            wait = max(wait, 0.005)  # otherwise waiting for a concurrency slot
+            if deadline is not None and now + wait > deadline:
+                self.throttled += 1
+                raise RateLimitTimeout(f"embedding budget exhausted, next slot in {wait:.2f}s")
+            await asyncio.sleep(wait)
+
+    def release(self, estimated_tokens=0, used_tokens=None, headers=None, rate_limited=False):
+        """ returns the concurrency slot and feeds back actual usage and response headers. """
+        self.in_flight -= 1
+        now = time.monotonic()
+
+        if used_tokens is not None:
+            # refund (or charge) the difference between the estimate and the real usage
+            self.tokens.take(used_tokens - estimated_tokens, now)
+        if headers is not None:
+            self.update_from_headers(headers, now)
+
+        if rate_limited:
+            self.concurrency = max(self.min_concurrency, self.concurrency / 2)
+            retry_after = headers.get("retry-after") if headers is not None else None
+            self.paused_until = max(self.paused_until, now + parse_retry_after(retry_after))
+        else:
+            self.concurrency = min(self.max_concurrency, self.concurrency + 1 / self.concurrency)
+
+    def update_from_headers(self, headers, now=None):
+        now = time.monotonic() if now is None else now
+
+        def number(name):
+            value = headers.get(name)
+            try:
+                return float(value) if value is not None else None
+            except ValueError:
+                return None
+
+        self.requests.sync(number("x-ratelimit-limit-requests"), number("x-ratelimit-remaining-requests"), now)
+        self.tokens.sync(number("x-ratelimit-limit-tokens"), number("x-ratelimit-remaining-tokens"), now)
+
+        # out of budget: hold everyone until the window the server reported resets
+        if number("x-ratelimit-remaining-requests") == 0:
+            self.paused_until = max(self.paused_until, now + parse_reset(headers.get("x-ratelimit-reset-requests")))
+        if number("x-ratelimit-remaining-tokens") == 0:
+            self.paused_until = max(self.paused_until, now + parse_reset(headers.get("x-ratelimit-reset-tokens")))
+
+    def stats(self) -> str:
+        return f"concurrency={int(self.concurrency)} in_flight={self.in_flight} throttled={self.throttled}"
+
+
+def build_rate_limiter(cfg):
+    """ builds an AsyncRateLimiter from an `openai.rate_limit` config section, or None if disabled. """
+    if not cfg.get("enabled", False):
+        return None
+    return AsyncRateLimiter(
+        cfg.get("requests_per_minute", 3000),
+        cfg.get("tokens_per_minute", 1_000_000),
+        max_concurrency=cfg.get("max_concurrency", 8),
+    )
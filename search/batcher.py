@@ -0,0 +1,77 @@
+import asyncio
+import time
+
+
+class EmbeddingBatcher:
+    """
+    collects query texts from concurrent requests for up to `window` seconds (or until
+    `max_batch_size` texts are waiting) and embeds them with a single call to `embed_many`,
+    then fans the vectors back out to the waiting requests.
+
+    `embed_many` is an async callable taking a list of texts and returning one vector per text.
+    """
+
+    def __init__(self, embed_many, window=0.01, max_batch_size=64):
+        self.embed_many = embed_many
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self._pending = []  # (text, future)
+        self._timer = None
+        self.batches = 0
+        self.texts = 0
+
+    async def embed(self, text):
+        """ returns (vector, size of the batch it was sent in). """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending, []
+        if batch:
+            asyncio.ensure_future(self._run(batch))
+
+    async def _run(self, batch):
+        # drop waiters that were cancelled while queued, and send duplicate texts only once
+        batch = [(text, future) for text, future in batch if not future.done()]
+        texts = list(dict.fromkeys(text for text, _ in batch))
+        if not texts:
+            return
+
+        start = time.time()
+        try:
+            vectors = await self.embed_many(texts)
+        except asyncio.CancelledError:
+            for _, future in batch:
+                future.cancel()
+            raise
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        batch_time = time.time() - start
+        self.batches += 1
+        self.texts += len(batch)
+        print(f"[BATCH] Embedded {len(texts)} texts for {len(batch)} requests in {batch_time:.2f}s")
+
+        by_text = dict(zip(texts, vectors))
+        for text, future in batch:
+            if not future.done():
+                future.set_result((by_text[text], len(batch)))
+
+    def stats(self) -> str:
+        avg = self.texts / self.batches if self.batches else 0.0
+        return f"batches={self.batches} avg_size={avg:.1f}"
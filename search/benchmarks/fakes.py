@@ -0,0 +1,322 @@
+"""
+local stand-ins for the three services a search talks to, for load tests that should not
+hit (or pay for) the real ones:
+
+    openai     POST /v1/embeddings, GET /v1/models/{model}            (--openai-port, default 9101)
+    qdrant     POST /collections/{name}/points/search[/batch], /points/recommend   (--qdrant-port, default 9102)
+    postgrest  GET /rest/v1/{table}?id=in.(...)&select=...            (--postgrest-port, default 9103)
+
+every fake sleeps for a latency drawn from its distribution and fails a fraction of requests:
+    fixed:MS            always MS milliseconds
+    uniform:LO:HI       uniform between LO and HI ms
+    lognormal:MEDIAN:SIGMA   long-tailed, like real network services (sigma 0.5 gives p99 ~ 3.2x median)
+
+vectors are derived from a hash of the text and results from a hash of the vector, so the
+same query always returns the same papers, and every returned paper exists in the postgrest fake.
+
+usage (from search/):
+    python -m benchmarks.fakes --openai-latency lognormal:40:0.4 --qdrant-latency lognormal:8:0.5 \\
+        --postgrest-latency lognormal:15:0.5 --error-rate 0.01
+
+then point the server (or the lambda handler) at them:
+    OPENAI_BASE_URL=http://127.0.0.1:9101/v1 OPENAI_API_KEY=fake \\
+    QDRANT_URL=http://127.0.0.1:9102 SUPABASE_URL=http://127.0.0.1:9103 SUPABASE_SERVICE_KEY=fake
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import multiprocessing
+import random
+import re
+import signal
+import socket
+import sys
+import time
+import uuid
+from array import array
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+
+class Latency:
+    """ a latency distribution parsed from `fixed:MS`, `uniform:LO:HI` or `lognormal:MEDIAN:SIGMA`. """
+
+    def __init__(self, spec):
+        kind, *params = spec.split(":")
+        params = [float(p) for p in params]
+        if kind == "fixed" and len(params) == 1:
+            self.sample_ms = lambda: params[0]
+        elif kind == "uniform" and len(params) == 2:
+            self.sample_ms = lambda: random.uniform(params[0], params[1])
+        elif kind == "lognormal" and len(params) == 2:
+            median, sigma = params
+            self.sample_ms = lambda: random.lognormvariate(0.0, sigma) * median
+        else:
+            raise ValueError(f"bad latency spec '{spec}', expected fixed:MS, uniform:LO:HI or lognormal:MEDIAN:SIGMA")
+        self.spec = spec
+
+    async def wait(self):
+        ms = self.sample_ms()
+        if ms > 0:
+            await asyncio.sleep(ms / 1000)
+
+
+class Behaviour:
+    """ latency + injected failures of one fake. """
+
+    def __init__(self, latency, error_rate=0.0, error_status=503):
+        self.latency = Latency(latency)
+        self.error_rate = error_rate
+        self.error_status = error_status
+
+    async def __call__(self):
+        """ sleeps, then returns an error response for a fraction of requests (None otherwise). """
+        await self.latency.wait()
+        if self.error_rate and random.random() < self.error_rate:
+            return JSONResponse(
+                {"error": {"message": "injected failure", "type": "fake_error"}, "status": {"error": "injected failure"}},
+                status_code=self.error_status,
+            )
+        return None
+
+
+def _seed(data) -> int:
+    return int.from_bytes(hashlib.sha256(data).digest()[:8], "big")
+
+
+def _paper_id(n) -> str:
+    return f"{2300 + n // 100000}.{n % 100000:05d}"
+
+
+def _point_id(pid) -> int:
+    # as written by the embedding pipeline
+    return uuid.uuid5(uuid.NAMESPACE_DNS, pid).int >> 64
+
+
+def _paper(pid):
+    rng = random.Random(_seed(pid.encode()))
+    words = ["graph", "neural", "transformer", "attention", "bayesian", "sparse", "retrieval", "quantum",
+             "diffusion", "contrastive", "federated", "kernel", "robust", "causal", "language", "vision"]
+    return {
+        "id": pid,
+        "title": " ".join(rng.choices(words, k=8)).capitalize(),
+        "authors": ", ".join(f"A. {w.capitalize()}" for w in rng.choices(words, k=3)),
+        "abstract": " ".join(rng.choices(words, k=150)),
+    }
+
+
+def openai_app(behaviour, dimension):
+    app = FastAPI(title="fake openai")
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        if (failure := await behaviour()) is not None:
+            return failure
+
+        texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        size = body.get("dimensions") or dimension
+        data = []
+        for i, text in enumerate(texts):
+            rng = random.Random(_seed(str(text).encode()))
+            vector = [rng.gauss(0.0, 1.0) for _ in range(size)]
+            if body.get("encoding_format") == "base64":
+                # the sdk asks for base64 float32 whenever numpy is installed
+                vector = base64.b64encode(array("f", vector).tobytes()).decode()
+            data.append({"object": "embedding", "index": i, "embedding": vector})
+
+        tokens = sum(len(str(text)) // 4 + 1 for text in texts)
+        return {
+            "object": "list",
+            "data": data,
+            "model": body.get("model", "fake"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+
+    @app.get("/v1/models/{model}")
+    async def model(model: str):
+        return {"id": model, "object": "model", "created": 0, "owned_by": "fake"}
+
+    return app
+
+
+def qdrant_app(behaviour, papers, payload):
+    app = FastAPI(title="fake qdrant")
+    rows = {_point_id(_paper_id(n)): n for n in range(papers)}
+
+    def points_for(rng, limit, exclude=()):
+        ids = [n for n in rng.sample(range(papers), min(limit + len(exclude), papers)) if n not in exclude][:limit]
+        scores = sorted((rng.uniform(0.2, 0.9) for _ in ids), reverse=True)
+
+        points = []
+        for n, score in zip(ids, scores):
+            pid = _paper_id(n)
+            point_payload = {"paper_id": pid}
+            if payload:
+                point_payload.update({k: v for k, v in _paper(pid).items() if k != "id"})
+            points.append({"id": _point_id(pid), "version": 0, "score": score, "payload": point_payload})
+        return points
+
+    def scored_points(body):
+        vector = body["vector"]
+        if isinstance(vector, dict):  # named vector
+            vector = vector["vector"]
+        rng = random.Random(_seed(array("f", vector).tobytes()))
+        return points_for(rng, body.get("limit", 10))
+
+    @app.post("/collections/{name}/points/search")
+    async def search(name: str, request: Request):
+        body = await request.json()
+        if (failure := await behaviour()) is not None:
+            return failure
+        return {"result": scored_points(body), "status": "ok", "time": 0.0}
+
+    @app.post("/collections/{name}/points/search/batch")
+    async def search_batch(name: str, request: Request):
+        body = await request.json()
+        if (failure := await behaviour()) is not None:
+            return failure
+        return {"result": [scored_points(search) for search in body["searches"]], "status": "ok", "time": 0.0}
+
+    @app.post("/collections/{name}/points/recommend")
+    async def recommend(name: str, request: Request):
+        body = await request.json()
+        if (failure := await behaviour()) is not None:
+            return failure
+
+        positive = [rows.get(point) for point in body.get("positive", [])]
+        if None in positive:
+            return JSONResponse({"status": {"error": "Not found: No point with this id found"}, "time": 0.0}, status_code=404)
+        rng = random.Random(_seed(str(positive).encode()))
+        return {"result": points_for(rng, body.get("limit", 10), exclude=set(positive)), "status": "ok", "time": 0.0}
+
+    return app
+
+
+IN_FILTER = re.compile(r"^in\.\((.*)\)$")
+
+
+def postgrest_app(behaviour, papers):
+    app = FastAPI(title="fake postgrest")
+    known = {_paper_id(n) for n in range(papers)}
+
+    @app.get("/rest/v1/{table}")
+    async def select(table: str, request: Request):
+        if (failure := await behaviour()) is not None:
+            return failure
+
+        params = request.query_params
+        match = IN_FILTER.match(params.get("id", ""))
+        ids = [pid for pid in match.group(1).split(",") if pid in known] if match else []
+        columns = params.get("select", "*")
+        if "limit" in params:
+            ids = ids[: int(params["limit"])]
+        rows = [_paper(pid) for pid in ids]
+        if columns != "*":
+            fields = columns.split(",")
+            rows = [{k: row.get(k) for k in fields} for row in rows]
+        return rows
+
+    return app
+
+
+class FakeServers:
+    """
+    runs every fake in its own process with its own uvicorn server, so the fakes do not share
+    a gil with each other (or with the load generator) and stop being the bottleneck first.
+    """
+
+    def __init__(self, apps, host="127.0.0.1"):
+        self.host = host
+        self.ports = [port for _, port in apps]
+        self.processes = [
+            multiprocessing.Process(
+                target=uvicorn.run,
+                args=(app,),
+                kwargs={"host": host, "port": port, "log_level": "warning", "access_log": False},
+                daemon=True,
+            )
+            for app, port in apps
+        ]
+
+    def start(self, timeout=30.0):
+        for process in self.processes:
+            process.start()
+        deadline = time.monotonic() + timeout
+        for port in self.ports:
+            while True:
+                try:
+                    socket.create_connection((self.host, port), timeout=1.0).close()
+                    break
+                except OSError:
+                    if time.monotonic() > deadline:
+                        raise RuntimeError(f"fake on port {port} did not start")
+                    time.sleep(0.05)
+
+    def stop(self):
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            process.join()
+
+
+def build_fakes(args) -> FakeServers:
+    def behaviour(latency, error_rate):
+        return Behaviour(latency, args.error_rate if error_rate is None else error_rate, args.error_status)
+
+    return FakeServers(
+        [
+            (openai_app(behaviour(args.openai_latency, args.openai_error_rate), args.dimension), args.openai_port),
+            (qdrant_app(behaviour(args.qdrant_latency, args.qdrant_error_rate), args.papers, args.payload), args.qdrant_port),
+            (postgrest_app(behaviour(args.postgrest_latency, args.postgrest_error_rate), args.papers), args.postgrest_port),
+        ],
+        host=args.host,
+    )
+
+
+def add_arguments(parser):
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--openai-port", type=int, default=9101)
+    parser.add_argument("--qdrant-port", type=int, default=9102)
+    parser.add_argument("--postgrest-port", type=int, default=9103)
+    parser.add_argument("--openai-latency", default="lognormal:40:0.4")
+    parser.add_argument("--qdrant-latency", default="lognormal:8:0.5")
+    parser.add_argument("--postgrest-latency", default="lognormal:15:0.5")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of failed requests, for every fake")
+    parser.add_argument("--openai-error-rate", type=float, help="overrides --error-rate for the openai fake")
+    parser.add_argument("--qdrant-error-rate", type=float, help="overrides --error-rate for the qdrant fake")
+    parser.add_argument("--postgrest-error-rate", type=float, help="overrides --error-rate for the postgrest fake")
+    parser.add_argument("--error-status", type=int, default=503, help="status of injected failures, e.g. 429")
+    parser.add_argument("--dimension", type=int, default=1536, help="embedding size")
+    parser.add_argument("--papers", type=int, default=100000, help="papers in the fake collection")
+    parser.add_argument("--payload", action="store_true", help="include title / authors / abstract in qdrant payloads")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    fakes = build_fakes(args)
+    fakes.start()
+    print(
+        f"fakes up: openai :{args.openai_port} ({args.openai_latency}), qdrant :{args.qdrant_port} "
+        f"({args.qdrant_latency}), postgrest :{args.postgrest_port} ({args.postgrest_latency}), "
+        f"error rate {args.error_rate}"
+    )
+    # stop the fakes on ctrl-c and on `kill` alike
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        for process in fakes.processes:
+            process.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        fakes.stop()
+
+
+if __name__ == "__main__":
+    main()
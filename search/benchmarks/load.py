@@ -0,0 +1,319 @@
+"""
+load generator for the search server and the lambda handler. every (rps, concurrency) level
+runs for --duration seconds and reports latency percentiles, throughput, errors and a per-stage
+breakdown, as json that can be compared across commits.
+
+targets:
+    --url http://127.0.0.1:8000     a running search server (`uvicorn main:app`); stages come
+                                    from its Server-Timing header
+    --lambda-dir ../lambda_search   the lambda handler, invoked in --concurrency worker processes
+                                    (one process = one container, serving one event at a time);
+                                    stages come from its json log lines. config.yaml is read from
+                                    the lambda dir if it has one, otherwise from the current dir
+
+with --rps the load is open loop: requests start on a fixed schedule whatever the latency, at
+most --concurrency at a time, and latency is measured from the scheduled start, so queueing
+behind a slow server shows up in the percentiles. --rps 0 runs closed loop: --concurrency
+clients each send their next request as soon as the previous one returns.
+
+usage (from search/, with benchmarks.fakes running and the server started against them):
+    python -m benchmarks.load --url http://127.0.0.1:8000 --rps 50 100 200 --concurrency 64 --output run.json
+    python -m benchmarks.load --lambda-dir ../lambda_search --rps 0 --concurrency 4 8
+    python -m benchmarks.load --url http://127.0.0.1:8000 --rps 100 --baseline run.json --max-regression 0.2
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from io import StringIO
+
+import httpx
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(sorted_values, p):
+    """ nearest-rank percentile of an already sorted list. """
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(p / 100 * len(sorted_values)) - 1, 0)
+    return sorted_values[rank]
+
+
+def distribution(values):
+    values = sorted(values)
+    summary = {f"p{p}": round(percentile(values, p), 2) for p in PERCENTILES}
+    summary["mean"] = round(sum(values) / len(values), 2) if values else 0.0
+    summary["max"] = round(values[-1], 2) if values else 0.0
+    return summary
+
+
+def parse_server_timing(header):
+    """ `embed;dur=12.1, vector;dur=30.4` -> {"embed": 12.1, "vector": 30.4} """
+    stages = {}
+    for entry in header.split(","):
+        name, _, params = entry.strip().partition(";")
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "dur" and name:
+                stages[name] = float(value)
+    return stages
+
+
+class HttpTarget:
+    """ GET /search on a running server. """
+
+    def __init__(self, url, concurrency):
+        self.name = url
+        self.client = httpx.AsyncClient(
+            base_url=url,
+            timeout=60.0,
+            limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+        )
+
+    async def call(self, query):
+        """ (status, {stage: ms}) """
+        response = await self.client.get("/search", params={"query": query})
+        return response.status_code, parse_server_timing(response.headers.get("server-timing", ""))
+
+    async def close(self):
+        await self.client.aclose()
+
+
+# lambda workers: each process imports the handler once, like a container's init phase
+_handler = None
+
+
+def _init_lambda_worker(lambda_dir):
+    global _handler
+    # the handler reads config.yaml from the working directory
+    if os.path.exists(os.path.join(lambda_dir, "config.yaml")):
+        os.chdir(lambda_dir)
+    sys.path.insert(0, lambda_dir)
+    import handler
+
+    _handler = handler
+
+
+def _invoke_lambda(query):
+    out = StringIO()
+    with redirect_stdout(out):
+        response = _handler.lambda_handler({"queryStringParameters": {"query": query}}, None)
+
+    stages = {}
+    for line in out.getvalue().splitlines():
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        if record.get("message") == "search":
+            stages = {key[:-3]: value for key, value in record.items() if key.endswith("_ms")}
+    return response["statusCode"], stages
+
+
+class LambdaTarget:
+    """ lambda_handler in `concurrency` warm worker processes. """
+
+    def __init__(self, lambda_dir, concurrency):
+        self.name = f"lambda:{lambda_dir}"
+        lambda_dir = os.path.abspath(lambda_dir)
+        self.pool = ProcessPoolExecutor(concurrency, initializer=_init_lambda_worker, initargs=(lambda_dir,))
+        # start every worker now, so imports are not counted as request latency
+        list(self.pool.map(_noop, range(concurrency * 4)))
+
+    async def call(self, query):
+        return await asyncio.get_running_loop().run_in_executor(self.pool, _invoke_lambda, query)
+
+    async def close(self):
+        self.pool.shutdown()
+
+
+def _noop(_):
+    time.sleep(0.01)
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = []
+        self.statuses = Counter()
+        self.stages = defaultdict(list)
+
+    def record(self, latency_ms, status, stages):
+        self.latencies.append(latency_ms)
+        self.statuses[str(status)] += 1
+        for stage, ms in stages.items():
+            self.stages[stage].append(ms)
+
+
+async def timed_call(target, query, start, recorder):
+    try:
+        status, stages = await target.call(query)
+    except Exception as e:
+        status, stages = type(e).__name__, {}
+    if recorder is not None:
+        recorder.record((time.perf_counter() - start) * 1000, status, stages)
+
+
+async def open_loop(target, queries, rps, concurrency, duration, recorder):
+    """ starts a request every 1/rps seconds, with at most `concurrency` in flight. """
+    semaphore = asyncio.Semaphore(concurrency)
+    tasks = []
+    begin = time.perf_counter()
+
+    async def one(query, scheduled):
+        async with semaphore:
+            await timed_call(target, query, scheduled, recorder)
+
+    for i in range(int(rps * duration)):
+        scheduled = begin + i / rps
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.ensure_future(one(queries(), scheduled)))
+    await asyncio.gather(*tasks)
+    return time.perf_counter() - begin
+
+
+async def closed_loop(target, queries, concurrency, duration, recorder):
+    """ `concurrency` clients sending back-to-back requests for `duration` seconds. """
+    begin = time.perf_counter()
+    deadline = begin + duration
+
+    async def client():
+        while time.perf_counter() < deadline:
+            await timed_call(target, queries(), time.perf_counter(), recorder)
+
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return time.perf_counter() - begin
+
+
+async def run_level(target, queries, rps, concurrency, duration, warmup):
+    if warmup:
+        await (open_loop(target, queries, rps, concurrency, warmup, None) if rps
+               else closed_loop(target, queries, concurrency, warmup, None))
+
+    recorder = Recorder()
+    elapsed = await (open_loop(target, queries, rps, concurrency, duration, recorder) if rps
+                     else closed_loop(target, queries, concurrency, duration, recorder))
+
+    ok = recorder.statuses.get("200", 0)
+    return {
+        "rps": rps,
+        "concurrency": concurrency,
+        "requests": len(recorder.latencies),
+        "throughput": round(len(recorder.latencies) / elapsed, 2),
+        "ok_throughput": round(ok / elapsed, 2),
+        "error_rate": round(1 - ok / len(recorder.latencies), 4) if recorder.latencies else 0.0,
+        "statuses": dict(recorder.statuses),
+        "latency_ms": distribution(recorder.latencies),
+        "stages_ms": {stage: distribution(values) for stage, values in sorted(recorder.stages.items())},
+    }
+
+
+def query_source(args):
+    """ returns a function drawing the next query; --distinct bounds how often queries repeat (cache hits). """
+    if args.queries:
+        with open(args.queries) as f:
+            pool = [line.strip() for line in f if len(line.strip()) >= 3]
+    else:
+        pool = [f"benchmark query {i}" for i in range(args.distinct)]
+    rng = random.Random(args.seed)
+    return lambda: rng.choice(pool)
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline, results, max_regression):
+    """ regressions of p99 latency or ok throughput against the same level of the baseline. """
+    previous = {(level["rps"], level["concurrency"]): level for level in baseline["levels"]}
+    regressions = []
+    for level in results["levels"]:
+        old = previous.get((level["rps"], level["concurrency"]))
+        if old is None:
+            continue
+        name = f"rps={level['rps']} concurrency={level['concurrency']}"
+        if old["latency_ms"]["p99"] and level["latency_ms"]["p99"] > old["latency_ms"]["p99"] * (1 + max_regression):
+            regressions.append(f"{name} p99: {old['latency_ms']['p99']:.0f}ms -> {level['latency_ms']['p99']:.0f}ms")
+        if old["ok_throughput"] and level["ok_throughput"] < old["ok_throughput"] * (1 - max_regression):
+            regressions.append(f"{name} throughput: {old['ok_throughput']:.1f}/s -> {level['ok_throughput']:.1f}/s")
+    return regressions
+
+
+async def run(args):
+    queries = query_source(args)
+    levels = []
+    for concurrency in args.concurrency:
+        target = LambdaTarget(args.lambda_dir, concurrency) if args.lambda_dir else HttpTarget(args.url, concurrency)
+        try:
+            for rps in args.rps:
+                level = await run_level(target, queries, rps, concurrency, args.duration, args.warmup)
+                levels.append(level)
+                latency = level["latency_ms"]
+                stages = ", ".join(f"{stage} {d['p50']:.0f}ms" for stage, d in level["stages_ms"].items())
+                print(
+                    f"rps {rps or 'max':>5} concurrency {concurrency:>4}: {level['throughput']:>8.1f} req/s, "
+                    f"p50 {latency['p50']:.0f}ms p95 {latency['p95']:.0f}ms p99 {latency['p99']:.0f}ms, "
+                    f"errors {level['error_rate']:.2%}" + (f" | p50 stages: {stages}" if stages else "")
+                )
+        finally:
+            await target.close()
+
+    return {
+        "target": target.name,
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "duration": args.duration,
+        "distinct_queries": None if args.queries else args.distinct,
+        "levels": levels,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--url", help="base url of a running search server")
+    target.add_argument("--lambda-dir", help="directory of handler.py")
+    parser.add_argument("--rps", type=float, nargs="+", default=[50.0], help="request rates; 0 = closed loop")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[32], help="max requests in flight")
+    parser.add_argument("--duration", type=float, default=30.0, help="measured seconds per level")
+    parser.add_argument("--warmup", type=float, default=5.0, help="unmeasured seconds before each level")
+    parser.add_argument("--queries", help="file with one query per line (default: synthetic queries)")
+    parser.add_argument("--distinct", type=int, default=1000, help="number of distinct synthetic queries")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the results as json")
+    parser.add_argument("--baseline", help="results json to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="allowed relative p99 / throughput change")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(json.load(f), results, args.max_regression)
+        if regressions:
+            print("\nregressions vs baseline:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print("\nno regressions vs baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+compares the concurrency ceiling of the old thread-pool qdrant path
+(sync QdrantClient via asyncio.to_thread) against the native AsyncQdrantClient.
+
+usage (from search/, with QDRANT_URL / QDRANT_API_KEY set):
+    python -m benchmarks.qdrant_concurrency --requests 2000 --concurrency 8 32 128 512
+    python -m benchmarks.qdrant_concurrency --grpc
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import time
+
+import yaml
+from dotenv import load_dotenv
+from qdrant_client import AsyncQdrantClient, QdrantClient
+
+
+def random_vector(size):
+    return [random.uniform(-1.0, 1.0) for _ in range(size)]
+
+
+async def run_level(search, concurrency, total, vector_size):
+    """ fires `total` searches with at most `concurrency` in flight; returns (throughput, latencies). """
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            await search(random_vector(vector_size))
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    elapsed = time.perf_counter() - start
+    return total / elapsed, latencies
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--config", default="config.yaml")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 128, 512])
+    parser.add_argument("--vector-size", type=int, default=1536)
+    parser.add_argument("--grpc", action="store_true", help="use the grpc transport for the async client")
+    args = parser.parse_args()
+
+    with open(args.config) as f:
+        config = yaml.safe_load(f)
+    collection = config["qdrant"]["collection_name"]
+    url, api_key = os.getenv("QDRANT_URL"), os.getenv("QDRANT_API_KEY")
+
+    sync_client = QdrantClient(url=url, api_key=api_key)
+    async_client = AsyncQdrantClient(url=url, api_key=api_key, prefer_grpc=args.grpc)
+
+    async def threaded_search(vector):
+        return await asyncio.to_thread(
+            sync_client.search, collection_name=collection, query_vector=vector, limit=10, with_payload=True
+        )
+
+    async def native_search(vector):
+        return await async_client.search(
+            collection_name=collection, query_vector=vector, limit=10, with_payload=True
+        )
+
+    paths = [("to_thread", threaded_search), ("async" + ("+grpc" if args.grpc else ""), native_search)]
+
+    print(f"{'path':<12} {'conc':>6} {'req/s':>10} {'p50 ms':>10} {'p99 ms':>10}")
+    for concurrency in args.concurrency:
+        for name, search in paths:
+            throughput, latencies = await run_level(search, concurrency, args.requests, args.vector_size)
+            print(
+                f"{name:<12} {concurrency:>6} {throughput:>10.1f} "
+                f"{statistics.median(latencies) * 1000:>10.1f} {percentile(latencies, 99) * 1000:>10.1f}"
+            )
+
+    sync_client.close()
+    await async_client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,120 @@
+"""
+recall@k vs. latency for quantized qdrant collections, run against a held-out query set.
+
+ground truth is an exact (brute force, unquantized) search on the reference collection.
+every collection passed with --collections is then searched with each oversampling value,
+with and without rescoring, and compared against it.
+
+collections with different quantization can be created by ingesting with a different
+qdrant.collection_name + qdrant.quantization in embedding/config.yaml, or in place with
+`update_collection(quantization_config=...)`.
+
+usage (from search/, with the usual .env):
+    python -m benchmarks.quantization_recall --queries queries.txt \\
+        --collections papers papers_int8 papers_binary --oversampling 1 2 4
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+import yaml
+from dotenv import load_dotenv
+from qdrant_client.http import models
+
+from clients import create_clients, close_clients
+from providers import create_provider
+
+
+def load_queries(path):
+    """ one query per line, or a jsonl file with a "query" field. """
+    queries = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            queries.append(json.loads(line)["query"] if line.startswith("{") else line)
+    return queries
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def search_ids(qdrant, collection, vector, k, params):
+    start = time.perf_counter()
+    hits = await qdrant.search(collection_name=collection, query_vector=vector, limit=k, search_params=params)
+    return [hit.id for hit in hits], time.perf_counter() - start
+
+
+async def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--config", default="config.yaml")
+    parser.add_argument("--queries", required=True, help="held-out queries, one per line or jsonl")
+    parser.add_argument("--collections", nargs="+", required=True)
+    parser.add_argument("--reference", help="unquantized collection for ground truth (default: first collection)")
+    parser.add_argument("--oversampling", type=float, nargs="+", default=[1.0, 2.0, 4.0])
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--output", help="also write the results as json to this file")
+    args = parser.parse_args()
+
+    with open(args.config) as f:
+        config = yaml.safe_load(f)
+    clients = create_clients(config)
+    provider = create_provider(config, clients.openai)
+
+    queries = load_queries(args.queries)
+    vectors = await provider.embed(queries)
+    reference = args.reference or args.collections[0]
+
+    exact = models.SearchParams(exact=True, quantization=models.QuantizationSearchParams(ignore=True))
+    truth = [set((await search_ids(clients.qdrant, reference, v, args.k, exact))[0]) for v in vectors]
+
+    rows = []
+    for collection in args.collections:
+        settings = [("ignore", models.SearchParams(quantization=models.QuantizationSearchParams(ignore=True)))]
+        for oversampling in args.oversampling:
+            for rescore in (False, True):
+                settings.append((
+                    f"os={oversampling:g} rescore={'on' if rescore else 'off'}",
+                    models.SearchParams(quantization=models.QuantizationSearchParams(
+                        rescore=rescore, oversampling=oversampling,
+                    )),
+                ))
+
+        for name, params in settings:
+            recalls, latencies = [], []
+            for vector, expected in zip(vectors, truth):
+                ids, latency = await search_ids(clients.qdrant, collection, vector, args.k, params)
+                recalls.append(len(expected.intersection(ids)) / max(len(expected), 1))
+                latencies.append(latency)
+
+            rows.append({
+                "collection": collection,
+                "setting": name,
+                f"recall@{args.k}": statistics.mean(recalls),
+                "p50_ms": statistics.median(latencies) * 1000,
+                "p99_ms": percentile(latencies, 99) * 1000,
+            })
+
+    print(f"{'collection':<20} {'setting':<24} {'recall@' + str(args.k):>10} {'p50 ms':>8} {'p99 ms':>8}")
+    for row in rows:
+        print(
+            f"{row['collection']:<20} {row['setting']:<24} {row[f'recall@{args.k}']:>10.3f} "
+            f"{row['p50_ms']:>8.1f} {row['p99_ms']:>8.1f}"
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"queries": len(queries), "k": args.k, "reference": reference, "results": rows}, f, indent=2)
+
+    await provider.close()
+    await close_clients(clients)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,364 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+
+def normalize_query(query: str) -> str:
+    """ lowercases and collapses whitespace so trivially different queries share a key. """
+    return " ".join(query.lower().split())
+
+
+class TTLCache:
+    """ bounded in-process lru cache where every entry expires after `ttl` seconds. """
+
+    def __init__(self, max_size=1024, ttl=3600.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+
+    def get(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+
+        value, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        self._data[key] = (value, time.monotonic() + self.ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteBackend:
+    """
+    shared cache stored in a local sqlite file.
+    lets every uvicorn worker on a host share hits without running an extra service.
+    sqlite calls are blocking (and may wait on another worker's write lock), so they run on
+    worker threads, one at a time per connection, instead of on the event loop.
+    """
+
+    def __init__(self, path, ttl=86400.0):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=0.05, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB, expires_at REAL)"
+        )
+
+    def _get(self, key):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT value FROM cache WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+
+    def _set(self, key, value):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, time.time() + self.ttl),
+            )
+
+    async def get(self, key):
+        try:
+            row = await asyncio.to_thread(self._get, key)
+        except sqlite3.Error as e:
+            print(f"[WARN] sqlite cache read failed: {e}")
+            return None
+        return row[0] if row else None
+
+    async def set(self, key, value):
+        try:
+            await asyncio.to_thread(self._set, key, value)
+        except sqlite3.Error as e:
+            print(f"[WARN] sqlite cache write failed: {e}")
+
+    async def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class RedisBackend:
+    """ shared cache in any redis-compatible server, used across lambda instances and hosts. """
+
+    def __init__(self, url, ttl=86400.0, prefix="paperfind:"):
+        try:
+            import redis.asyncio as redis
+        except ImportError as e:
+            raise RuntimeError("the redis cache backend requires the `redis` package") from e
+
+        self.ttl = ttl
+        self.prefix = prefix
+        self._client = redis.from_url(url)
+
+    async def get(self, key):
+        try:
+            return await self._client.get(self.prefix + key)
+        except Exception as e:
+            print(f"[WARN] redis cache read failed: {e}")
+            return None
+
+    async def set(self, key, value):
+        try:
+            await self._client.set(self.prefix + key, value, ex=int(self.ttl))
+        except Exception as e:
+            print(f"[WARN] redis cache write failed: {e}")
+
+    async def close(self):
+        await self._client.aclose()
+
+
+def build_shared_backend(cfg):
+    """ returns the shared backend selected by `backend` in a cache config section, or None. """
+    backend = cfg.get("backend", "none")
+    ttl = cfg.get("ttl", 86400)
+
+    if backend == "sqlite":
+        return SQLiteBackend(cfg.get("sqlite_path", "cache.db"), ttl=ttl)
+    if backend == "redis":
+        return RedisBackend(os.getenv("REDIS_URL") or cfg.get("redis_url", "redis://localhost:6379/0"), ttl=ttl)
+    return None
+
+
+class EmbeddingCache:
+    """
+    query embedding cache keyed on normalized query text + model name.
+    checks the in-process lru first, then the optional shared backend.
+    """
+
+    def __init__(self, local: TTLCache, shared=None):
+        self.local = local
+        self.shared = shared
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(query: str, model: str) -> str:
+        digest = hashlib.sha256(normalize_query(query).encode("utf-8")).hexdigest()
+        return f"emb:{model}:{digest}"
+
+    async def get(self, query: str, model: str):
+        key = self.key(query, model)
+
+        vector = self.local.get(key)
+        if vector is None and self.shared is not None:
+            blob = await self.shared.get(key)
+            if blob is not None:
+                vector = array("f", blob).tolist()
+                self.local.set(key, vector)
+
+        if vector is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return vector
+
+    async def set(self, query: str, model: str, vector):
+        key = self.key(query, model)
+        self.local.set(key, vector)
+        if self.shared is not None:
+            await self.shared.set(key, array("f", vector).tobytes())
+
+    def stats(self) -> str:
+        return f"hits={self.hits} misses={self.misses}"
+
+    async def close(self):
+        if self.shared is not None:
+            await self.shared.close()
+
+
+class MetadataCache:
+    """ per paper id metadata cache, so only ids that miss have to be fetched from supabase. """
+
+    def __init__(self, local: TTLCache):
+        self.local = local
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, paper_ids):
+        """ returns ({paper_id: row} for cached ids, [paper ids that missed] in input order). """
+        found = {}
+        missing = []
+        for pid in paper_ids:
+            row = self.local.get(pid)
+            if row is None:
+                missing.append(pid)
+            else:
+                found[pid] = row
+
+        self.hits += len(found)
+        self.misses += len(missing)
+        return found, missing
+
+    def set_many(self, rows):
+        for row in rows:
+            self.local.set(row["id"], row)
+
+    def stats(self) -> str:
+        return f"hits={self.hits} misses={self.misses}"
+
+
+class ResultCache:
+    """
+    whole-response cache for searches, keyed on normalized query + limit + filters + collection
+    version. an entry is fresh for `fresh_ttl` seconds, then served stale for up to `stale_ttl`
+    more while the caller refreshes it. a new collection version changes every key, so an
+    ingestion run invalidates all cached responses at once and old entries just age out.
+    """
+
+    def __init__(self, local: TTLCache, fresh_ttl=300.0, stale_ttl=86400.0, shared=None):
+        self.local = local
+        self.fresh_ttl = fresh_ttl
+        self.stale_ttl = stale_ttl
+        self.shared = shared
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(query: str, limit: int, filters, version: str) -> str:
+        params = json.dumps({"query": normalize_query(query), "limit": limit, "filters": filters}, sort_keys=True)
+        return f"res:{version}:{hashlib.sha256(params.encode('utf-8')).hexdigest()}"
+
+    async def get(self, key):
+        """ returns (entry, fresh), or (None, False) on a miss. entries are {"results", "etag", "created"}. """
+        entry = self.local.get(key)
+        if entry is None and self.shared is not None:
+            blob = await self.shared.get(key)
+            if blob is not None:
+                entry = json.loads(blob)
+                self.local.set(key, entry)
+
+        if entry is None:
+            self.misses += 1
+            return None, False
+
+        fresh = self.age(entry) < self.fresh_ttl
+        if fresh:
+            self.hits += 1
+        else:
+            self.stale_hits += 1
+        return entry, fresh
+
+    async def set(self, key, results):
+        """ caches a json-serializable result list and returns its entry. """
+        body = json.dumps(results, sort_keys=True, separators=(",", ":"))
+        entry = {
+            "results": results,
+            "etag": '"' + hashlib.sha256(body.encode("utf-8")).hexdigest()[:32] + '"',
+            "created": time.time(),
+        }
+        self.local.set(key, entry)
+        if self.shared is not None:
+            await self.shared.set(key, json.dumps(entry).encode("utf-8"))
+        return entry
+
+    @staticmethod
+    def age(entry) -> float:
+        return max(time.time() - entry["created"], 0.0)
+
+    def cache_control(self, entry) -> str:
+        """ lets browsers and cdns reuse the response for the rest of its freshness, then revalidate. """
+        max_age = max(int(self.fresh_ttl - self.age(entry)), 0)
+        return f"public, max-age={max_age}, stale-while-revalidate={int(self.stale_ttl)}"
+
+    def stats(self) -> str:
+        return f"hits={self.hits} stale={self.stale_hits} misses={self.misses}"
+
+    async def close(self):
+        if self.shared is not None:
+            await self.shared.close()
+
+
+def etag_matches(if_none_match, etag) -> bool:
+    """ whether an If-None-Match header value matches the etag (weak comparison, lists and *). """
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in (tag[2:] if tag.startswith("W/") else tag for tag in candidates)
+
+
+class CollectionVersion:
+    """
+    the collection version marker the embedding pipeline bumps after every run. it is re-read
+    at most every `interval` seconds, in the background, so a slow read never holds up searches
+    (cache hits included); it is abandoned after `timeout` seconds. if a read fails the last
+    known version is kept.
+    """
+
+    def __init__(self, fetch, interval=30.0, timeout=1.0):
+        self.fetch = fetch
+        self.interval = interval
+        self.timeout = timeout
+        self.version = "unknown"
+        self._checked_at = None
+        self._refresh = None  # in-flight read
+
+    def _due(self) -> bool:
+        return self._checked_at is None or time.monotonic() - self._checked_at >= self.interval
+
+    async def _read(self):
+        try:
+            self.version = str(await asyncio.wait_for(self.fetch(), self.timeout))
+        except Exception as e:
+            print(f"[WARN] collection version read failed, keeping '{self.version}': {e!r}")
+        finally:
+            self._checked_at = time.monotonic()
+
+    def _read_done(self, task):
+        self._refresh = None
+
+    async def get(self) -> str:
+        """ the last known version. a due re-read is started in the background, not awaited. """
+        if self._due() and self._refresh is None:
+            self._refresh = asyncio.ensure_future(self._read())
+            self._refresh.add_done_callback(self._read_done)
+
+        if self._checked_at is None and self._refresh is not None:
+            # nothing read yet: wait for the first read, which is bounded by `timeout`
+            await asyncio.wait({self._refresh})
+        return self.version
+
+
+def build_embedding_cache(cfg):
+    """ builds an EmbeddingCache from the `cache.embeddings` config section, or None if disabled. """
+    if not cfg.get("enabled", True):
+        return None
+    local = TTLCache(max_size=cfg.get("max_size", 10000), ttl=cfg.get("ttl", 86400))
+    return EmbeddingCache(local, build_shared_backend(cfg))
+
+
+def build_metadata_cache(cfg):
+    """ builds a MetadataCache from the `cache.metadata` config section, or None if disabled. """
+    if not cfg.get("enabled", True):
+        return None
+    return MetadataCache(TTLCache(max_size=cfg.get("max_size", 50000), ttl=cfg.get("ttl", 86400)))
+
+
+def build_result_cache(cfg):
+    """ builds a ResultCache from the `cache.results` config section, or None if disabled. """
+    if not cfg.get("enabled", True):
+        return None
+    fresh_ttl = cfg.get("fresh_ttl", 300)
+    stale_ttl = cfg.get("stale_ttl", 86400)
+    # entries are dropped once they are too old to be served even stale
+    local = TTLCache(max_size=cfg.get("max_size", 10000), ttl=fresh_ttl + stale_ttl)
+    shared = build_shared_backend({**cfg, "ttl": fresh_ttl + stale_ttl})
+    return ResultCache(local, fresh_ttl=fresh_ttl, stale_ttl=stale_ttl, shared=shared)
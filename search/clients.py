@@ -0,0 +1,110 @@
+import os
+import uuid
+from dataclasses import dataclass
+
+import grpc
+import httpx
+from openai import AsyncOpenAI
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.http import models
+
+
+@dataclass
+class Clients:
+    """ long-lived, pooled clients for every downstream service. """
+    openai: AsyncOpenAI
+    qdrant: AsyncQdrantClient
+    supabase: httpx.AsyncClient
+
+
+def _http_client(cfg, **kwargs) -> httpx.AsyncClient:
+    """ keep-alive httpx client with pool limits, timeouts and http/2 from the `http` config section. """
+    limits = httpx.Limits(
+        max_connections=cfg.get("max_connections", 100),
+        max_keepalive_connections=cfg.get("max_keepalive_connections", 20),
+        keepalive_expiry=cfg.get("keepalive_expiry", 30.0),
+    )
+    timeout = httpx.Timeout(cfg.get("timeout", 10.0), connect=cfg.get("connect_timeout", 5.0))
+    return httpx.AsyncClient(limits=limits, timeout=timeout, http2=cfg.get("http2", True), **kwargs)
+
+
+def create_qdrant_client(config) -> AsyncQdrantClient:
+    """ native async qdrant client, over grpc when `qdrant.prefer_grpc` is set. """
+    qdrant_cfg = config.get("qdrant", {})
+    return AsyncQdrantClient(
+        url=os.getenv("QDRANT_URL"),
+        api_key=os.getenv("QDRANT_API_KEY"),
+        prefer_grpc=qdrant_cfg.get("prefer_grpc", False),
+        grpc_port=qdrant_cfg.get("grpc_port", 6334),
+        timeout=int(config.get("http", {}).get("timeout", 10.0)),
+    )
+
+
+# grpc failures that mean the server was unreachable or too slow, worth a retry (qdrant.prefer_grpc)
+TRANSIENT_GRPC_CODES = (grpc.StatusCode.UNAVAILABLE, grpc.StatusCode.DEADLINE_EXCEEDED)
+
+
+def grpc_status(error):
+    """ the grpc.StatusCode of a failed grpc call (grpc.aio.AioRpcError / grpc.RpcError), otherwise None. """
+    if isinstance(error, grpc.RpcError) and callable(getattr(error, "code", None)):
+        return error.code()
+    return None
+
+
+def point_id(paper_id: str) -> int:
+    """ qdrant point id of a paper, as written by the embedding pipeline (embedding/src/vector.py). """
+    return uuid.uuid5(uuid.NAMESPACE_DNS, paper_id).int >> 64
+
+
+def qdrant_search_params(config):
+    """
+    search params from `qdrant.search`: for quantized collections, fetch `oversampling` x limit
+    candidates with the quantized vectors and rescore them against the original vectors.
+    """
+    cfg = config.get("qdrant", {}).get("search", {})
+    if not cfg:
+        return None
+
+    return models.SearchParams(
+        hnsw_ef=cfg.get("hnsw_ef"),
+        exact=cfg.get("exact", False),
+        quantization=models.QuantizationSearchParams(
+            ignore=cfg.get("ignore_quantization", False),
+            rescore=cfg.get("rescore", True),
+            oversampling=cfg.get("oversampling"),
+        ),
+    )
+
+
+def create_clients(config) -> Clients:
+    http_cfg = config.get("http", {})
+
+    # retry_async is the only retry layer: sdk retries would stack under it, outlast the request
+    # deadline and bypass the rate limiter's accounting
+    openai_client = AsyncOpenAI(
+        api_key=os.getenv("OPENAI_API_KEY"),
+        http_client=_http_client(http_cfg),
+        max_retries=0,
+    )
+
+    qdrant = create_qdrant_client(config)
+
+    supabase_key = os.getenv("SUPABASE_SERVICE_KEY", "")
+    supabase = _http_client(
+        http_cfg,
+        base_url=f"{os.getenv('SUPABASE_URL')}/rest/v1",
+        headers={
+            "apikey": supabase_key,
+            "Authorization": f"Bearer {supabase_key}",
+            "Content-Type": "application/json",
+            "Accept": "application/json",
+        },
+    )
+
+    return Clients(openai=openai_client, qdrant=qdrant, supabase=supabase)
+
+
+async def close_clients(clients: Clients):
+    await clients.openai.close()
+    await clients.supabase.aclose()
+    await clients.qdrant.close()
@@ -4,6 +4,7 @@ from openai import RateLimitError, APIError
 from qdrant_client.http.exceptions import UnexpectedResponse
 
 from exceptions import AppError
+from resilience import DeadlineExceeded
 
 def register_exception_handlers(app):
     @app.exception_handler(AppError)
@@ -13,6 +14,13 @@ def register_exception_handlers(app):
             content={"error": exc.__class__.__name__, "detail": str(exc)},
         )
 
+    @app.exception_handler(DeadlineExceeded)
+    async def handle_deadline_exceeded(request: Request, exc: DeadlineExceeded):
+        return JSONResponse(
+            status_code=504,
+            content={"error": "DeadlineExceeded", "detail": str(exc)},
+        )
+
     @app.exception_handler(RateLimitError)
     async def handle_rate_limit_error(request: Request, exc: RateLimitError):
         return JSONResponse(
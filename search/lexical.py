@@ -0,0 +1,108 @@
+import json
+import math
+import re
+from pathlib import Path
+
+import numpy as np
+
+from vector_index import Hit
+
+# layout written by embedding/src/bm25.py
+META_FILE = "meta.json"
+DOC_IDS_FILE = "doc_ids.txt"
+DOC_LENS_FILE = "doc_lens.bin"
+LEXICON_FILE = "lexicon.tsv"
+POSTINGS_DOCS_FILE = "postings_docs.bin"
+POSTINGS_TFS_FILE = "postings_tfs.bin"
+
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-.][a-z0-9]+)*")
+
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the their this "
+    "to was we were which with our these those can not".split()
+)
+
+
+def tokenize(text: str):
+    """ must stay identical to tokenize() in embedding/src/bm25.py. """
+    return [t for t in TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    read-only bm25 index over paper titles + abstracts.
+    postings are memory-mapped uint32 doc numbers + uint8 term frequencies, and scoring
+    is vectorized over each query term's postings with numpy.
+    """
+
+    def __init__(self, path, k1=1.2, b=0.75):
+        index_dir = Path(path)
+        meta = json.loads((index_dir / META_FILE).read_text())
+        self.docs = meta["docs"]
+        self.avgdl = meta["avgdl"] or 1.0
+        self.k1 = k1
+        self.b = b
+
+        self.lexicon = {}
+        with open(index_dir / LEXICON_FILE, encoding="utf-8") as f:
+            for line in f:
+                term, df, offset = line.rstrip("\n").split("\t")
+                self.lexicon[term] = (int(df), int(offset))
+
+        with open(index_dir / DOC_IDS_FILE, encoding="utf-8") as f:
+            self.doc_ids = f.read().splitlines()
+
+        self.doc_lens = np.fromfile(index_dir / DOC_LENS_FILE, dtype=np.uint32).astype(np.float32)
+        self.postings_docs = np.memmap(index_dir / POSTINGS_DOCS_FILE, dtype=np.uint32, mode="r")
+        self.postings_tfs = np.memmap(index_dir / POSTINGS_TFS_FILE, dtype=np.uint8, mode="r")
+        # per-doc length normalization is the same for every query, so compute it once
+        self.norm = self.k1 * (1 - self.b + self.b * self.doc_lens / self.avgdl)
+
+    def search(self, query, limit=10):
+        """ top `limit` docs by bm25 score, best first. """
+        scores = np.zeros(self.docs, dtype=np.float32)
+        matched = False
+
+        for term in set(tokenize(query)):
+            entry = self.lexicon.get(term)
+            if entry is None:
+                continue
+            df, offset = entry
+            docs = self.postings_docs[offset : offset + df]
+            tfs = self.postings_tfs[offset : offset + df].astype(np.float32)
+
+            idf = math.log(1 + (self.docs - df + 0.5) / (df + 0.5))
+            scores[docs] += idf * tfs * (self.k1 + 1) / (tfs + self.norm[docs])
+            matched = True
+
+        if not matched:
+            return []
+
+        k = min(limit, self.docs)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            Hit(id=int(doc), score=float(scores[doc]), payload={"paper_id": self.doc_ids[doc]})
+            for doc in top
+            if scores[doc] > 0
+        ]
+
+
+def reciprocal_rank_fusion(rankings, weights, k=60, limit=10):
+    """
+    merges ranked hit lists into one: score(paper) = sum of weight / (k + rank) over the lists
+    it appears in. the payload of the first list a paper appears in is kept, so put the vector
+    results first to keep any display payload they carry.
+    """
+    scores = {}
+    payloads = {}
+    for hits, weight in zip(rankings, weights):
+        for rank, hit in enumerate(hits, start=1):
+            pid = hit.payload.get("paper_id")
+            if not pid:
+                continue
+            scores[pid] = scores.get(pid, 0.0) + weight / (k + rank)
+            payloads.setdefault(pid, hit.payload)
+
+    ranked = sorted(scores, key=scores.get, reverse=True)[:limit]
+    return [Hit(id=i, score=scores[pid], payload=payloads[pid]) for i, pid in enumerate(ranked)]
@@ -1,12 +1,41 @@
-from fastapi import FastAPI, Query, HTTPException
+from fastapi import FastAPI, Query, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from qdrant_client import QdrantClient
-from qdrant_client.http.exceptions import UnexpectedResponse
-from openai import AsyncOpenAI, APIError, RateLimitError
+from pydantic import BaseModel, conlist, constr
+from qdrant_client.http import models
+from qdrant_client.http.exceptions import ResponseHandlingException, UnexpectedResponse
+from openai import APIError, RateLimitError
 from exception_handlers import register_exception_handlers
 from exceptions import ExternalServiceError, RateLimitExceeded, NotFoundError
-import os
+from cache import (
+    build_embedding_cache,
+    build_metadata_cache,
+    build_result_cache,
+    normalize_query,
+    etag_matches,
+    CollectionVersion,
+)
+from singleflight import SingleFlight
+from batcher import EmbeddingBatcher
+from clients import TRANSIENT_GRPC_CODES, create_clients, close_clients, grpc_status, point_id, qdrant_search_params
+from providers import create_provider
+from ratelimit import build_rate_limiter, RateLimitTimeout
+from vector_index import LocalVectorIndex
+from lexical import BM25Index, reciprocal_rank_fusion
+from resilience import CircuitOpen, build_circuit_breakers, build_deadline, build_hedgers, time_left
+from metrics import (
+    StageTimer,
+    IN_FLIGHT,
+    REQUESTS,
+    REQUEST_SECONDS,
+    RETRIES,
+    CACHE_LOOKUPS,
+    CIRCUIT_STATE,
+    HEDGES,
+    record_cache,
+    render,
+)
+from contextlib import asynccontextmanager
+import grpc
 import yaml
 from dotenv import load_dotenv
 import asyncio
@@ -19,9 +48,56 @@ import time
 with open("config.yaml", "r") as f:
     config = yaml.safe_load(f)
 
-openai_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+TABLE_NAME = config["supabase"]["papers_table"]
+VERSIONS_TABLE = config["supabase"].get("versions_table", "collection_versions")
+RESULT_LIMIT = 10
+BATCH_MAX_QUERIES = config.get("batch_search", {}).get("max_queries", 50)
+search_params = qdrant_search_params(config)
+
+embedding_cache = build_embedding_cache(config.get("cache", {}).get("embeddings", {}))
+metadata_cache = build_metadata_cache(config.get("cache", {}).get("metadata", {}))
+result_cache = build_result_cache(config.get("cache", {}).get("results", {}))
+search_flight = SingleFlight() if config.get("coalesce_requests", True) else None
+hybrid_cfg = config.get("hybrid", {})
+rate_limiter = build_rate_limiter(config["openai"].get("rate_limit", {}))
+server_timing = config.get("metrics", {}).get("server_timing", True)
+resilience_cfg = config.get("resilience", {})
+
+# pooled openai / qdrant / supabase clients and the embedding provider, created once per worker in lifespan()
+clients = None
+provider = None
+local_index = None
+lexical_index = None
+
+@asynccontextmanager
+async def lifespan(app):
+    global clients, provider, local_index, lexical_index
+    clients = create_clients(config)
+    provider = create_provider(config, clients.openai, rate_limiter)
+    if config.get("vector_backend", "qdrant") == "local":
+        index_cfg = config.get("local_index", {})
+        local_index = LocalVectorIndex(
+            index_cfg.get("path", "data/index"),
+            ann=index_cfg.get("ann", False),
+            ef=index_cfg.get("ef", 64),
+        )
+    if hybrid_cfg.get("enabled", False):
+        lexical_index = BM25Index(
+            hybrid_cfg.get("bm25_path", "data/bm25"),
+            k1=hybrid_cfg.get("k1", 1.2),
+            b=hybrid_cfg.get("b", 0.75),
+        )
+    try:
+        yield
+    finally:
+        await provider.close()
+        await close_clients(clients)
+        if embedding_cache is not None:
+            await embedding_cache.close()
+        if result_cache is not None:
+            await result_cache.close()
 
-app = FastAPI(title="Paperfind API")
+app = FastAPI(title="Paperfind API", lifespan=lifespan)
 register_exception_handlers(app)
 
 # cors
@@ -31,16 +107,32 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "ETag", "X-Cache"],
 )
 
-qdrant = QdrantClient(
-    url=os.getenv("QDRANT_URL"),
-    api_key=os.getenv("QDRANT_API_KEY")
-)
+@app.middleware("http")
+async def track_requests(request: Request, call_next):
+    if request.url.path == "/metrics":
+        return await call_next(request)
 
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_KEY")
-TABLE_NAME = config["supabase"]["papers_table"]
+    start = time.perf_counter()
+    status = 500
+    try:
+        with IN_FLIGHT.track_inprogress():
+            response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # label by route template, not raw url, to keep the label set bounded
+        route = request.scope.get("route")
+        path = route.path if route is not None else "unmatched"
+        REQUEST_SECONDS.labels(path).observe(time.perf_counter() - start)
+        REQUESTS.labels(path, str(status)).inc()
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    body, content_type = render()
+    return Response(content=body, media_type=content_type)
 
 retry_exceptions = (
         TimeoutError,
@@ -50,8 +142,12 @@ retry_exceptions = (
         APIError,
         RateLimitError,
         UnexpectedResponse,
+        ResponseHandlingException,  # qdrant-client's wrapper for transport failures (refused, timed out)
     )
 
+def is_transient(error):
+    return isinstance(error, retry_exceptions) or grpc_status(error) in TRANSIENT_GRPC_CODES
+
 class SearchResult(BaseModel):
     id: str
     title: str
@@ -59,89 +155,270 @@ class SearchResult(BaseModel):
     abstract: str
     score: float
 
+class BatchSearchRequest(BaseModel):
+    queries: conlist(constr(min_length=3), min_items=1, max_items=BATCH_MAX_QUERIES)
+
+class BatchSearchResult(BaseModel):
+    query: str
+    results: list[SearchResult]
+
 # fetch metadata from supabase
 async def fetch_metadata(paper_ids):
     ids_filter = ",".join(paper_ids)
-    url = f"{SUPABASE_URL}/rest/v1/{TABLE_NAME}?id=in.({ids_filter})&select=id,title,authors,abstract"
+    resp = await clients.supabase.get(
+        f"/{TABLE_NAME}",
+        params={"id": f"in.({ids_filter})", "select": "id,title,authors,abstract"},
+    )
+    resp.raise_for_status()
+    return resp.json()
 
-    headers = {
-        "apikey": SUPABASE_KEY,
-        "Authorization": f"Bearer {SUPABASE_KEY}",
-        "Content-Type": "application/json",
-        "Accept": "application/json"
-    }
+# version marker the embedding pipeline bumps after every run; part of every result cache key
+async def fetch_collection_version():
+    resp = await clients.supabase.get(
+        f"/{VERSIONS_TABLE}",
+        params={"collection": f"eq.{config['qdrant']['collection_name']}", "select": "version"},
+    )
+    resp.raise_for_status()
+    rows = resp.json()
+    return rows[0]["version"] if rows else "0"
+
+# read through the supabase circuit breaker, so an open circuit keeps the last version without waiting
+collection_version = CollectionVersion(
+    lambda: retry_async(fetch_collection_version, dependency="supabase"),
+    interval=config.get("cache", {}).get("results", {}).get("version_check_interval", 30),
+    timeout=config.get("cache", {}).get("results", {}).get("version_check_timeout", 1.0),
+)
+
+CIRCUIT_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+def circuit_changed(dependency, state):
+    CIRCUIT_STATE.labels(dependency).set(CIRCUIT_STATES[state])
+    print(f"[WARN] Circuit breaker for {dependency} is now {state}")
 
-    async with httpx.AsyncClient() as client:
-        resp = await client.get(url, headers=headers, timeout=10.0)
-        resp.raise_for_status()
-        data = resp.json()
-        return data
-    
-async def retry_async(func, *args, **kwargs):
+def hedge_sent(operation, won):
+    HEDGES.labels(operation, "won" if won else "lost").inc()
+
+# one breaker per downstream service, and hedging for the idempotent reads
+breakers = build_circuit_breakers(
+    resilience_cfg.get("circuit_breaker", {}), ["openai", "qdrant", "supabase"], on_change=circuit_changed
+)
+hedgers = build_hedgers(resilience_cfg.get("hedging", {}), ["qdrant", "supabase"], on_hedge=hedge_sent)
+
+async def retry_async(func, *args, dependency=None, hedge=False, **kwargs):
+    """
+    calls func, retrying transient errors with exponential backoff, but only while the current
+    stage has budget left for the next attempt. `dependency` selects the circuit breaker guarding
+    the call; `hedge` marks an idempotent read that may be sent twice (see resilience.Hedger).
+    """
     max_retries = config.get("max_retries", 3)
     base_delay = config.get("base_delay", 0.5)
+    breaker = breakers.get(dependency)
+    hedger = hedgers.get(dependency) if hedge else None
+
+    async def call():
+        if inspect.iscoroutinefunction(func):
+            return await func(*args, **kwargs)
+        # run sync functions in a thread pool to avoid blocking
+        return await asyncio.to_thread(func, *args, **kwargs)
 
     for attempt in range(max_retries):
         try:
-            if inspect.iscoroutinefunction(func):
-                return await func(*args, **kwargs)
-            else:
-                # run sync functions in a thread pool to avoid blocking
-                return await asyncio.to_thread(func, *args, **kwargs)
-            
-        except RateLimitError as e:
+            if breaker is not None:
+                breaker.before_call()
+            result = await (hedger.call(call) if hedger is not None else call())
+
+        except CircuitOpen as e:
+            raise ExternalServiceError(str(e), status_code=503) from e
+
+        except (RateLimitError, RateLimitTimeout) as e:
+            if breaker is not None:
+                breaker.record_cancelled()
             raise RateLimitExceeded(str(e)) from e
-        
+
+        except asyncio.CancelledError:
+            if breaker is not None:
+                # cut off by the stage deadline (timer callbacks may fire a hair early): a hanging
+                # dependency counts as failing. any other cancellation, e.g. a client that went away, does not
+                left = time_left()
+                if left is not None and left < 0.01:
+                    breaker.record_failure()
+                else:
+                    breaker.record_cancelled()
+            raise
+
         except Exception as e:
-            if attempt == max_retries - 1 or not isinstance(e, retry_exceptions) :
-                raise ExternalServiceError(f"{func.__name__} failed after {max_retries} retries: {e}") from e
+            transient = is_transient(e)
+            if breaker is not None:
+                if transient:
+                    breaker.record_failure()
+                else:
+                    breaker.record_cancelled()
+            if attempt == max_retries - 1 or not transient:
+                raise ExternalServiceError(f"{func.__name__} failed after {attempt + 1} attempts: {e}") from e
 
-            # exponential backoff + jitter
+            # exponential backoff + jitter, if the stage can still afford another attempt
             delay = base_delay * (2 ** attempt) + random.uniform(0, 0.1)
+            left = time_left()
+            if left is not None and delay >= left:
+                raise ExternalServiceError(
+                    f"{func.__name__} failed after {attempt + 1} attempts, no time left to retry: {e}"
+                ) from e
+            RETRIES.labels(func.__name__).inc()
             print(f"[WARN] Attempt {attempt+1}/{max_retries} failed for {func.__name__}: {e}. Retrying in {delay:.2f}s...")
             await asyncio.sleep(delay)
 
-@app.get("/search", response_model=list[SearchResult])
-async def search_papers(query: str = Query(..., min_length=3, description="Search query")):
-    start_total = time.time()
+        else:
+            if breaker is not None:
+                breaker.record_success()
+            return result
 
-    # openai embedding
-    start_openai = time.time()
-    response = await retry_async(
-        openai_client.embeddings.create,
-        model=config["openai"]["model"],
-        input=query
-    )
-    vector = response.data[0].embedding
-    openai_time = time.time() - start_openai
+# embed a list of texts with one provider call, vectors returned in input order
+async def embed_texts(texts):
+    return await retry_async(provider.embed, texts, dependency=provider.name)
+
+batch_cfg = config.get("embedding_batch", {})
+embedding_batcher = EmbeddingBatcher(
+    embed_texts,
+    window=batch_cfg.get("window_ms", 10) / 1000,
+    max_batch_size=batch_cfg.get("max_batch_size", 64),
+) if batch_cfg.get("enabled", True) else None
+
+# embed a query, going through the embedding cache and the micro-batcher when they are enabled.
+# returns (vector, cache hit, size of the openai batch the query was sent in)
+async def embed_query(query):
+    model = provider.model_id
+
+    if embedding_cache is not None:
+        vector = await embedding_cache.get(query, model)
+        record_cache("embedding", vector is not None, vector is None)
+        if vector is not None:
+            return vector, True, 0
+
+    if embedding_batcher is not None:
+        vector, batch_size = await embedding_batcher.embed(query)
+    else:
+        vector, batch_size = (await embed_texts([query]))[0], 1
 
-    # qdrant search
-    start_qdrant = time.time()
-    results = await retry_async(
-        qdrant.search,
+    if embedding_cache is not None:
+        await embedding_cache.set(query, model, vector)
+    return vector, False, batch_size
+
+# metadata for paper_ids in the given order; only cache misses are fetched, in one batched request
+async def get_metadata(paper_ids, hedge=True):
+    if metadata_cache is None:
+        return await retry_async(fetch_metadata, paper_ids, dependency="supabase", hedge=hedge)
+
+    found, missing = metadata_cache.get_many(paper_ids)
+    record_cache("metadata", len(found), len(missing))
+    if missing:
+        rows = await retry_async(fetch_metadata, missing, dependency="supabase", hedge=hedge)
+        metadata_cache.set_many(rows)
+        found.update({row["id"]: row for row in rows})
+
+    return [found[pid] for pid in paper_ids if pid in found]
+
+# top-k search against qdrant, or the embedded local index with vector_backend: local
+async def vector_search(vector, limit=10):
+    if local_index is not None:
+        # numpy releases the gil during the matmul, so a worker thread keeps the loop responsive
+        return await asyncio.to_thread(local_index.search, vector, limit)
+
+    return await retry_async(
+        clients.qdrant.search,
         collection_name=config["qdrant"]["collection_name"],
         query_vector=vector,
-        limit=10,
-        with_payload=True
+        search_params=search_params,
+        limit=limit,
+        with_payload=True,
+        dependency="qdrant",
+        hedge=True,
     )
-    qdrant_time = time.time() - start_qdrant
 
-    # get paper ids
-    paper_ids = [res.payload.get("paper_id") for res in results if res.payload.get("paper_id")]
+# vectors for a list of queries: embedding cache hits are reused and all misses go to the provider
+# in one call. returns (vectors, number of cache hits)
+async def embed_queries(queries):
+    model = provider.model_id
+    vectors = {}
+    if embedding_cache is not None:
+        cached = await asyncio.gather(*(embedding_cache.get(query, model) for query in queries))
+        vectors = {query: vector for query, vector in zip(queries, cached) if vector is not None}
+        record_cache("embedding", len(vectors), len(queries) - len(vectors))
 
-    if not paper_ids:
-        total_time = time.time() - start_total
-        print(f"[TIMING] OpenAI: {openai_time:.2f}s, Qdrant: {qdrant_time:.2f}s, Metadata: 0.00s, Total: {total_time:.2f}s")
-        raise NotFoundError("No papers found for this query.")
+    missing = [query for query in queries if query not in vectors]
+    if missing:
+        embedded = await embed_texts(missing)
+        vectors.update(zip(missing, embedded))
+        if embedding_cache is not None:
+            await asyncio.gather(*(embedding_cache.set(query, model, vector) for query, vector in zip(missing, embedded)))
+    return [vectors[query] for query in queries], len(queries) - len(missing)
 
-    # fetch metadata
-    start_supabase = time.time()
-    metadata_list = await retry_async(fetch_metadata, paper_ids)
-    supabase_time = time.time() - start_supabase
+# one top-k list per vector, from a single qdrant search_batch request. not hedged: batches are
+# large and their latencies would skew the hedge delay of single searches
+async def vector_search_batch(vectors, limit=10):
+    if local_index is not None:
+        return await asyncio.to_thread(lambda: [local_index.search(vector, limit) for vector in vectors])
 
-    metadata_map = {p["id"]: p for p in metadata_list}
+    return await retry_async(
+        clients.qdrant.search_batch,
+        collection_name=config["qdrant"]["collection_name"],
+        requests=[
+            models.SearchRequest(vector=vector, params=search_params, limit=limit, with_payload=True)
+            for vector in vectors
+        ],
+        dependency="qdrant",
+    )
 
-    # merge results
+# qdrant recommendations from the stored vector of a paper, which they exclude; None if the paper has no point.
+# a missing point is an answer, not a failure, so it must not be retried or trip the circuit breaker
+async def recommend_points(paper_id, limit):
+    try:
+        return await clients.qdrant.recommend(
+            collection_name=config["qdrant"]["collection_name"],
+            positive=[point_id(paper_id)],
+            search_params=search_params,
+            limit=limit,
+            with_payload=True,
+        )
+    except UnexpectedResponse as e:
+        if e.status_code == 404:
+            return None
+        raise
+    except grpc.RpcError as e:
+        # qdrant.prefer_grpc: the same answer arrives as a NOT_FOUND status
+        if grpc_status(e) == grpc.StatusCode.NOT_FOUND:
+            return None
+        raise
+
+# papers nearest to an indexed paper, reusing its stored vector instead of embedding it again
+async def similar_search(paper_id, limit=10):
+    if local_index is not None:
+        return await asyncio.to_thread(local_index.similar, paper_id, limit)
+    return await retry_async(recommend_points, paper_id, limit, dependency="qdrant", hedge=True)
+
+# bm25 top-k over titles + abstracts; returns (hits, seconds taken)
+async def lexical_search(query, limit):
+    start = time.time()
+    hits = await asyncio.to_thread(lexical_index.search, query, limit)
+    return hits, time.time() - start
+
+DISPLAY_FIELDS = ("title", "authors", "abstract")
+
+# {paper_id: metadata}. with qdrant.metadata_source: payload the display fields come straight from the
+# qdrant payload, and supabase is only queried for papers whose payload is missing some of them
+async def resolve_metadata(results, paper_ids, hedge=True):
+    metadata_map = {}
+    if config["qdrant"].get("metadata_source", "supabase") == "payload":
+        for res in results:
+            if all(field in res.payload for field in DISPLAY_FIELDS):
+                metadata_map[res.payload["paper_id"]] = res.payload
+
+    missing = [pid for pid in paper_ids if pid not in metadata_map]
+    if missing:
+        metadata_map.update({p["id"]: p for p in await get_metadata(missing, hedge=hedge)})
+    return metadata_map
+
+# search results in score order, joined with their metadata; results without metadata are dropped
+def merge_results(results, metadata_map):
     combined_results = []
     for res in results:
         pid = res.payload.get("paper_id")
@@ -157,8 +434,259 @@ async def search_papers(query: str = Query(..., min_length=3, description="Searc
                 score=res.score
             )
         )
+    return combined_results
+
+def cache_stats(cache_hit, batch_size):
+    stats = ""
+    if embedding_batcher is not None and batch_size:
+        stats += f", Embedding batch: {batch_size} ({embedding_batcher.stats()})"
+    if embedding_cache is not None:
+        stats += f", Embedding cache: {'hit' if cache_hit else 'miss'} ({embedding_cache.stats()})"
+    if metadata_cache is not None:
+        stats += f", Metadata cache: {metadata_cache.stats()}"
+    if result_cache is not None:
+        stats += f", Result cache: {result_cache.stats()}"
+    if rate_limiter is not None:
+        stats += f", Rate limit: {rate_limiter.stats()}"
+    return stats
+
+# full openai -> qdrant -> supabase pipeline for one query; returns (results, stage timer)
+async def run_search(query):
+    start_total = time.time()
+    timer = StageTimer()
+    # every stage runs within its share of the request's time budget
+    deadline = build_deadline(resilience_cfg.get("deadline", {}))
+
+    # hybrid retrieval: bm25 runs concurrently with embedding + vector search, and both
+    # candidate lists are merged with reciprocal rank fusion
+    lexical_task = None
+    limit = RESULT_LIMIT
+    if lexical_index is not None:
+        limit = hybrid_cfg.get("candidates", 50)
+        lexical_task = asyncio.ensure_future(lexical_search(query, limit))
+
+    try:
+        # openai embedding
+        with timer.stage("embed") as stage:
+            vector, cache_hit, batch_size = await deadline.run("embed", embed_query(query))
+        openai_time = stage.seconds
+
+        # qdrant search
+        with timer.stage("vector") as stage:
+            results = await deadline.run("vector", vector_search(vector, limit=limit))
+        qdrant_time = stage.seconds
+    except BaseException:
+        if lexical_task is not None:
+            lexical_task.cancel()
+        raise
+
+    lexical_stats = ""
+    if lexical_task is not None:
+        lexical_hits, lexical_time = await deadline.run("lexical", lexical_task)
+        timer.record("lexical", lexical_time)
+        lexical_stats = f", Lexical: {lexical_time:.2f}s"
+        results = reciprocal_rank_fusion(
+            [results, lexical_hits],
+            [hybrid_cfg.get("vector_weight", 1.0), hybrid_cfg.get("lexical_weight", 1.0)],
+            k=hybrid_cfg.get("rrf_k", 60),
+            limit=RESULT_LIMIT,
+        )
+
+    # get paper ids
+    paper_ids = [res.payload.get("paper_id") for res in results if res.payload.get("paper_id")]
+
+    if not paper_ids:
+        total_time = time.time() - start_total
+        timer.record("total", total_time)
+        print(f"[TIMING] OpenAI: {openai_time:.2f}s, Qdrant: {qdrant_time:.2f}s{lexical_stats}, Metadata: 0.00s, Total: {total_time:.2f}s{cache_stats(cache_hit, batch_size)}")
+        raise NotFoundError("No papers found for this query.")
+
+    # fetch metadata
+    with timer.stage("metadata") as stage:
+        metadata_map = await deadline.run("metadata", resolve_metadata(results, paper_ids))
+    supabase_time = stage.seconds
+
+    # merge results
+    combined_results = merge_results(results, metadata_map)
+
+    total_time = time.time() - start_total
+    timer.record("total", total_time)
+    print(f"[TIMING] OpenAI: {openai_time:.2f}s, Qdrant: {qdrant_time:.2f}s{lexical_stats}, Metadata: {supabase_time:.2f}s, Total: {total_time:.2f}s{cache_stats(cache_hit, batch_size)}")
+
+    return combined_results, timer
+
+# many queries at one round trip per stage: one embedding call, one qdrant search_batch and one
+# metadata fetch for the union of the papers found. returns ({query: results}, stage timer)
+async def run_batch_search(queries):
+    start_total = time.time()
+    timer = StageTimer()
+    deadline = build_deadline(resilience_cfg.get("deadline", {}))
+
+    lexical_task = None
+    limit = RESULT_LIMIT
+    if lexical_index is not None:
+        limit = hybrid_cfg.get("candidates", 50)
+        lexical_task = asyncio.ensure_future(
+            asyncio.to_thread(lambda: [lexical_index.search(query, limit) for query in queries])
+        )
+
+    try:
+        with timer.stage("batch_embed") as stage:
+            vectors, cache_hits = await deadline.run("embed", embed_queries(queries))
+        openai_time = stage.seconds
+
+        with timer.stage("batch_vector") as stage:
+            batch_results = await deadline.run("vector", vector_search_batch(vectors, limit=limit))
+        qdrant_time = stage.seconds
+    except BaseException:
+        if lexical_task is not None:
+            lexical_task.cancel()
+        raise
+
+    if lexical_task is not None:
+        with timer.stage("batch_lexical"):
+            lexical_hits = await deadline.run("lexical", lexical_task)
+        batch_results = [
+            reciprocal_rank_fusion(
+                [results, hits],
+                [hybrid_cfg.get("vector_weight", 1.0), hybrid_cfg.get("lexical_weight", 1.0)],
+                k=hybrid_cfg.get("rrf_k", 60),
+                limit=RESULT_LIMIT,
+            )
+            for results, hits in zip(batch_results, lexical_hits)
+        ]
+
+    # one metadata fetch for every paper in the batch, however many queries found it
+    all_results = [res for results in batch_results for res in results]
+    paper_ids = list(dict.fromkeys(res.payload.get("paper_id") for res in all_results if res.payload.get("paper_id")))
+    metadata_map = {}
+    with timer.stage("batch_metadata") as stage:
+        if paper_ids:
+            metadata_map = await deadline.run("metadata", resolve_metadata(all_results, paper_ids, hedge=False))
+    supabase_time = stage.seconds
 
     total_time = time.time() - start_total
-    print(f"[TIMING] OpenAI: {openai_time:.2f}s, Qdrant: {qdrant_time:.2f}s, Metadata: {supabase_time:.2f}s, Total: {total_time:.2f}s")
+    timer.record("batch_total", total_time)
+    print(
+        f"[TIMING] Batch of {len(queries)} queries, {len(paper_ids)} papers. OpenAI: {openai_time:.2f}s, "
+        f"Qdrant: {qdrant_time:.2f}s, Metadata: {supabase_time:.2f}s, Total: {total_time:.2f}s, "
+        f"Embedding cache hits: {cache_hits}"
+    )
+
+    return {query: merge_results(results, metadata_map) for query, results in zip(queries, batch_results)}, timer
+
+# "more like this": vector neighbours of a paper joined with their metadata; returns (results, stage timer)
+async def run_similar(paper_id):
+    start_total = time.time()
+    timer = StageTimer()
+    deadline = build_deadline(resilience_cfg.get("deadline", {}))
+
+    with timer.stage("similar_vector") as stage:
+        results = await deadline.run("vector", similar_search(paper_id, limit=RESULT_LIMIT))
+    qdrant_time = stage.seconds
+    if results is None:
+        raise NotFoundError(f"Paper {paper_id} is not indexed.")
+
+    # the source paper is excluded by id, this also drops duplicate points of the same paper
+    results = [res for res in results if res.payload.get("paper_id") != paper_id]
+    paper_ids = [res.payload.get("paper_id") for res in results if res.payload.get("paper_id")]
+    if not paper_ids:
+        raise NotFoundError(f"No papers similar to {paper_id} found.")
+
+    with timer.stage("similar_metadata") as stage:
+        metadata_map = await deadline.run("metadata", resolve_metadata(results, paper_ids))
+    supabase_time = stage.seconds
+
+    total_time = time.time() - start_total
+    timer.record("similar_total", total_time)
+    print(f"[TIMING] Similar to {paper_id}. Qdrant: {qdrant_time:.2f}s, Metadata: {supabase_time:.2f}s, Total: {total_time:.2f}s")
+
+    return merge_results(results, metadata_map), timer
+
+async def search_results(query):
+    if search_flight is None:
+        return await run_search(query)
+    # identical concurrent queries share one pipeline execution (and its stage timings)
+    return await search_flight.do(normalize_query(query), run_search, query)
+
+# stale result cache entries are recomputed off the request path; one refresh per key at a time
+refresh_flight = SingleFlight()
+background_tasks = set()
+
+async def refresh_result(key, query):
+    try:
+        results, _ = await search_results(query)
+        await result_cache.set(key, [r.dict() for r in results])
+    except Exception as e:
+        print(f"[WARN] Background refresh failed for '{query}': {e}")
+
+def schedule_refresh(key, query):
+    task = asyncio.ensure_future(refresh_flight.do(key, refresh_result, key, query))
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+@app.get("/search", response_model=list[SearchResult])
+async def search_papers(
+    request: Request,
+    response: Response,
+    query: str = Query(..., min_length=3, description="Search query"),
+):
+    if result_cache is None:
+        results, timer = await search_results(query)
+        if server_timing:
+            response.headers["Server-Timing"] = timer.server_timing()
+        return results
+
+    lookup = StageTimer()
+    with lookup.stage("result_cache"):
+        key = result_cache.key(query, RESULT_LIMIT, None, await collection_version.get())
+        entry, fresh = await result_cache.get(key)
+
+    if entry is None:
+        state = "miss"
+        results, timer = await search_results(query)
+        entry = await result_cache.set(key, [r.dict() for r in results])
+    else:
+        state = "hit" if fresh else "stale"
+        timer = StageTimer()
+        if not fresh:
+            # stale-while-revalidate: answer now, recompute for the next request
+            schedule_refresh(key, query)
+    CACHE_LOOKUPS.labels("results", state).inc()
+
+    headers = {
+        "ETag": entry["etag"],
+        "Cache-Control": result_cache.cache_control(entry),
+        "X-Cache": state.upper(),
+    }
+    if server_timing:
+        headers["Server-Timing"] = timer.server_timing(**lookup.durations)
+
+    if etag_matches(request.headers.get("if-none-match"), entry["etag"]):
+        return Response(status_code=304, headers=headers)
+
+    response.headers.update(headers)
+    return entry["results"]
+
+@app.post("/search/batch", response_model=list[BatchSearchResult])
+async def search_papers_batch(request: BatchSearchRequest, response: Response):
+    # queries that only differ in case or whitespace are searched once
+    distinct = {}
+    for query in request.queries:
+        distinct.setdefault(normalize_query(query), query)
+
+    results, timer = await run_batch_search(list(distinct.values()))
+    if server_timing:
+        response.headers["Server-Timing"] = timer.server_timing()
+    return [
+        BatchSearchResult(query=query, results=results[distinct[normalize_query(query)]])
+        for query in request.queries
+    ]
 
-    return combined_results
\ No newline at end of file
+# :path so old-style arxiv ids like hep-th/9901001 match too
+@app.get("/papers/{paper_id:path}/similar", response_model=list[SearchResult])
+async def similar_papers(paper_id: str, response: Response):
+    results, timer = await run_similar(paper_id)
+    if server_timing:
+        response.headers["Server-Timing"] = timer.server_timing()
+    return results
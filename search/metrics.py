@@ -0,0 +1,88 @@
+import os
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    REGISTRY,
+    generate_latest,
+)
+
+# request latencies sit between a few ms (cache hits) and a few seconds (retries)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+STAGE_SECONDS = Histogram(
+    "search_stage_seconds",
+    "latency of each search stage (embed, vector, lexical, metadata) and of the whole pipeline (total); batch_ / similar_ for /search/batch and /papers/{id}/similar",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+REQUEST_SECONDS = Histogram("search_request_seconds", "http request latency, by route", ["path"], buckets=LATENCY_BUCKETS)
+REQUESTS = Counter("search_requests_total", "finished http requests, by route and status code", ["path", "status"])
+IN_FLIGHT = Gauge("search_requests_in_flight", "http requests being served", multiprocess_mode="livesum")
+RETRIES = Counter("search_retries_total", "retried downstream calls, by operation", ["operation"])
+CIRCUIT_STATE = Gauge(
+    "search_circuit_state", "circuit breaker state per dependency (0 closed, 1 half open, 2 open)",
+    ["dependency"], multiprocess_mode="livemax",
+)
+HEDGES = Counter("search_hedged_requests_total", "hedged downstream reads, by operation and whether the hedge won", ["operation", "result"])
+CACHE_LOOKUPS = Counter("search_cache_lookups_total", "cache lookups, by cache and result (hit / stale / miss)", ["cache", "result"])
+
+
+class StageTimer:
+    """
+    collects the duration of each stage of one search. every stage is observed in the
+    stage histogram and kept for the Server-Timing header.
+    """
+
+    def __init__(self):
+        self.durations = {}
+
+    def record(self, stage, seconds):
+        self.durations[stage] = self.durations.get(stage, 0.0) + seconds
+        STAGE_SECONDS.labels(stage).observe(seconds)
+
+    def stage(self, name):
+        return _Stage(self, name)
+
+    def server_timing(self, **extra) -> str:
+        """ Server-Timing header value, e.g. `embed;dur=12.1, vector;dur=30.4`. """
+        durations = {**self.durations, **extra}
+        return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in durations.items())
+
+
+class _Stage:
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds = time.perf_counter() - self.start
+        self.timer.record(self.name, self.seconds)
+
+
+def record_cache(cache, hits, misses):
+    if hits:
+        CACHE_LOOKUPS.labels(cache, "hit").inc(hits)
+    if misses:
+        CACHE_LOOKUPS.labels(cache, "miss").inc(misses)
+
+
+def render():
+    """ (body, content type) of the /metrics response. """
+    # uvicorn --workers: every worker writes to PROMETHEUS_MULTIPROC_DIR, and any of them
+    # can aggregate the whole server's metrics from there
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,221 @@
+import asyncio
+import contextvars
+import time
+from collections import deque
+
+# absolute monotonic time by which the current stage must finish, set by Deadline.run
+_stage_end = contextvars.ContextVar("stage_end", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """ a stage (or the whole request) ran out of its time budget. """
+
+
+class CircuitOpen(Exception):
+    """ raised without calling a dependency while its circuit breaker is open. """
+
+
+def time_left():
+    """ seconds left in the current stage's budget, or None when no budget applies. """
+    end = _stage_end.get()
+    return None if end is None else end - time.monotonic()
+
+
+class Deadline:
+    """
+    time budget of one request, split across its stages. a stage gets at most its own budget
+    and never more than what is left of the request's, so time an early stage does not use
+    stays available to the later ones. `total=None` disables the request budget.
+    """
+
+    def __init__(self, total=None, stage_budgets=None):
+        self.end = None if total is None else time.monotonic() + total
+        self.stage_budgets = stage_budgets or {}
+
+    def remaining(self):
+        return None if self.end is None else self.end - time.monotonic()
+
+    async def run(self, stage, awaitable):
+        """ awaits `awaitable` within the stage's budget; raises DeadlineExceeded when it runs out. """
+        now = time.monotonic()
+        end = self.end
+        if stage in self.stage_budgets:
+            stage_end = now + self.stage_budgets[stage]
+            end = stage_end if end is None else min(end, stage_end)
+        if end is None:
+            return await awaitable
+
+        if end <= now:
+            if asyncio.iscoroutine(awaitable):
+                awaitable.close()
+            raise DeadlineExceeded(f"no time left for {stage}")
+
+        # the task wait_for creates copies this context, so retries inside the stage can see the budget
+        token = _stage_end.set(end)
+        try:
+            return await asyncio.wait_for(awaitable, end - now)
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded(f"{stage} did not finish within its {(end - now) * 1000:.0f}ms budget") from None
+        finally:
+            _stage_end.reset(token)
+
+
+class CircuitBreaker:
+    """
+    fails fast while a dependency is down. after `failure_threshold` consecutive failures the
+    circuit opens and calls raise CircuitOpen for `reset_timeout` seconds. then a single trial
+    call is let through (half open): success closes the circuit, failure opens it again.
+
+    `on_change(name, state)` is called on every state change, e.g. to log or export it.
+    """
+
+    CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=10.0, on_change=None):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.on_change = on_change
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+
+    def _set_state(self, state):
+        if state != self.state:
+            self.state = state
+            if self.on_change is not None:
+                self.on_change(self.name, state)
+
+    def before_call(self):
+        if self.state == self.OPEN:
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                raise CircuitOpen(f"{self.name} circuit is open")
+            self._set_state(self.HALF_OPEN)
+            self._trial_in_flight = False
+
+        if self.state == self.HALF_OPEN:
+            if self._trial_in_flight:
+                raise CircuitOpen(f"{self.name} circuit is half open, waiting for the trial call")
+            self._trial_in_flight = True
+
+    def record_success(self):
+        self.failures = 0
+        self._trial_in_flight = False
+        self._set_state(self.CLOSED)
+
+    def record_failure(self):
+        self._trial_in_flight = False
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self._opened_at = time.monotonic()
+            self._set_state(self.OPEN)
+
+    def record_cancelled(self):
+        """ the call was abandoned without an outcome; frees the half-open trial slot. """
+        self._trial_in_flight = False
+
+
+class Hedger:
+    """
+    hedged idempotent reads: when the first call has not returned after the operation's recent
+    `quantile` latency, an identical second call is sent and whichever succeeds first wins; the
+    other one is cancelled. about (1 - quantile) of the calls are hedged, which trims the tail
+    for a few percent of extra load.
+
+    `on_hedge(name, won)` is called for every hedge that was sent, `won` telling if it returned first.
+    """
+
+    def __init__(self, name, quantile=0.95, window=200, min_samples=20, initial_delay=0.1, min_delay=0.01,
+                 on_hedge=None):
+        self.name = name
+        self.quantile = quantile
+        self.min_samples = min_samples
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self.on_hedge = on_hedge
+        self._latencies = deque(maxlen=window)
+
+    def delay(self) -> float:
+        if len(self._latencies) < self.min_samples:
+            return self.initial_delay
+        latencies = sorted(self._latencies)
+        return max(latencies[int(self.quantile * (len(latencies) - 1))], self.min_delay)
+
+    async def call(self, make_call):
+        """ runs the zero-argument coroutine function `make_call`, hedged. """
+        started = {}
+
+        def launch():
+            task = asyncio.ensure_future(make_call())
+            started[task] = time.monotonic()
+            return task
+
+        hedge = None
+        pending = {launch()}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=self.delay())
+            if not done:
+                hedge = launch()
+                pending.add(hedge)
+
+            while True:
+                for task in done:
+                    if task.exception() is None:
+                        self._latencies.append(time.monotonic() - started[task])
+                        if hedge is not None and self.on_hedge is not None:
+                            self.on_hedge(self.name, task is hedge)
+                        return task.result()
+                    error = task.exception()
+                if not pending:
+                    # every call failed (a call failing before the hedge delay is not hedged)
+                    raise error
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in pending:
+                task.cancel()
+
+
+def build_deadline(cfg) -> Deadline:
+    """ a new request budget from the `resilience.deadline` config section (unlimited if disabled). """
+    if not cfg.get("enabled", True):
+        return Deadline()
+    total_ms = cfg.get("total_ms")
+    stages_ms = cfg.get("stages_ms") or {}
+    return Deadline(
+        None if total_ms is None else total_ms / 1000,
+        {stage: ms / 1000 for stage, ms in stages_ms.items()},
+    )
+
+
+def build_circuit_breakers(cfg, dependencies, on_change=None):
+    """ {dependency: CircuitBreaker} from the `resilience.circuit_breaker` config section, empty if disabled. """
+    if not cfg.get("enabled", True):
+        return {}
+    return {
+        name: CircuitBreaker(
+            name,
+            failure_threshold=cfg.get("failure_threshold", 5),
+            reset_timeout=cfg.get("reset_timeout", 10.0),
+            on_change=on_change,
+        )
+        for name in dependencies
+    }
+
+
+def build_hedgers(cfg, operations, on_hedge=None):
+    """ {operation: Hedger} from the `resilience.hedging` config section, empty if disabled. """
+    if not cfg.get("enabled", True):
+        return {}
+    return {
+        name: Hedger(
+            name,
+            quantile=cfg.get("quantile", 0.95),
+            window=cfg.get("window", 200),
+            min_samples=cfg.get("min_samples", 20),
+            initial_delay=cfg.get("initial_delay_ms", 100) / 1000,
+            min_delay=cfg.get("min_delay_ms", 10) / 1000,
+            on_hedge=on_hedge,
+        )
+        for name in operations
+    }
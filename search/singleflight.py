@@ -0,0 +1,47 @@
+import asyncio
+
+
+class SingleFlight:
+    """
+    coalesces concurrent calls with the same key into one in-flight execution.
+
+    the shared call runs as its own task, so a cancelled caller (e.g. a client that
+    disconnected) does not cancel it for the other waiters. it is only cancelled once
+    every waiter has gone. exceptions are raised to every waiter.
+    """
+
+    def __init__(self):
+        self._calls = {}  # key -> [task, waiter count]
+
+    async def do(self, key, func, *args, **kwargs):
+        call = self._calls.get(key)
+        if call is None:
+            task = asyncio.ensure_future(func(*args, **kwargs))
+            call = [task, 0]
+            self._calls[key] = call
+            task.add_done_callback(lambda t: self._finish(key, t))
+
+        task = call[0]
+        call[1] += 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            call[1] -= 1
+            if call[1] == 0 and not task.done():
+                # nobody is waiting anymore, drop the call before cancelling so new
+                # callers start a fresh execution instead of joining a cancelled one
+                self._forget(key, task)
+                task.cancel()
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    def _forget(self, key, task):
+        call = self._calls.get(key)
+        if call is not None and call[0] is task:
+            del self._calls[key]
+
+    def _finish(self, key, task):
+        self._forget(key, task)
+        if not task.cancelled():
+            task.exception()  # mark as retrieved even if every waiter has gone
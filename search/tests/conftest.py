@@ -0,0 +1,7 @@
+import os
+import sys
+
+# main.py reads config.yaml from the working directory and imports its siblings as top-level modules
+SEARCH_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SEARCH_DIR)
+os.chdir(SEARCH_DIR)
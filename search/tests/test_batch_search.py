@@ -0,0 +1,42 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+# no `with`: the lifespan (and with it every downstream client) is never started, so a request
+# that got past validation would fail instead of silently doing embedding and qdrant work
+client = TestClient(main.app, raise_server_exceptions=False)
+
+
+@pytest.fixture(autouse=True)
+def no_search(monkeypatch):
+    calls = []
+
+    async def run_batch_search(queries):
+        calls.append(queries)
+        raise AssertionError("invalid batch reached the search pipeline")
+
+    monkeypatch.setattr(main, "run_batch_search", run_batch_search)
+    yield
+    assert calls == []
+
+
+def test_rejects_empty_batch():
+    response = client.post("/search/batch", json={"queries": []})
+    assert response.status_code == 422
+
+
+def test_rejects_batch_over_max_queries():
+    queries = [f"query number {i}" for i in range(main.BATCH_MAX_QUERIES + 1)]
+    response = client.post("/search/batch", json={"queries": queries})
+    assert response.status_code == 422
+
+
+def test_rejects_short_query():
+    response = client.post("/search/batch", json={"queries": ["graph neural networks", "ab"]})
+    assert response.status_code == 422
+
+
+def test_rejects_missing_queries():
+    response = client.post("/search/batch", json={})
+    assert response.status_code == 422
@@ -0,0 +1,164 @@
+import asyncio
+
+import pytest
+
+import resilience
+from resilience import CircuitBreaker, CircuitOpen, Hedger
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(resilience.time, "monotonic", clock)
+    return clock
+
+
+@pytest.fixture
+def breaker(clock):
+    changes = []
+    breaker = CircuitBreaker("qdrant", failure_threshold=3, reset_timeout=10, on_change=lambda name, state: changes.append(state))
+    breaker.changes = changes
+    return breaker
+
+
+def test_opens_after_consecutive_failures(breaker):
+    for _ in range(2):
+        breaker.before_call()
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpen):
+        breaker.before_call()
+    assert breaker.changes == ["open"]
+
+
+def test_success_resets_the_failure_count(breaker):
+    for _ in range(2):
+        breaker.record_failure()
+    breaker.record_success()
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_half_open_lets_one_trial_through_and_closes_on_success(breaker, clock):
+    for _ in range(3):
+        breaker.record_failure()
+
+    clock.now += 10
+    breaker.before_call()  # the trial call
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    with pytest.raises(CircuitOpen, match="half open"):
+        breaker.before_call()
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.before_call()
+    assert breaker.changes == ["open", "half_open", "closed"]
+
+
+def test_failed_trial_reopens_for_another_reset_timeout(breaker, clock):
+    for _ in range(3):
+        breaker.record_failure()
+    clock.now += 10
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    clock.now += 5
+    with pytest.raises(CircuitOpen):
+        breaker.before_call()
+    clock.now += 5
+    breaker.before_call()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+
+def test_cancelled_trial_frees_the_half_open_slot(breaker, clock):
+    for _ in range(3):
+        breaker.record_failure()
+    clock.now += 10
+    breaker.before_call()
+    breaker.record_cancelled()
+    breaker.before_call()  # a new trial is allowed
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+
+def test_hedge_wins_and_the_slow_call_is_cancelled():
+    outcomes = []
+    cancelled = []
+    attempts = 0
+
+    async def make_call():
+        nonlocal attempts
+        attempts += 1
+        me = attempts
+        try:
+            await asyncio.sleep(1.0 if me == 1 else 0.01)
+        except asyncio.CancelledError:
+            cancelled.append(me)
+            raise
+        return me
+
+    async def scenario():
+        hedger = Hedger("qdrant", initial_delay=0.02, on_hedge=lambda name, won: outcomes.append(won))
+        result = await hedger.call(make_call)
+        await asyncio.sleep(0)  # let the cancellation be delivered
+        return result
+
+    assert asyncio.run(scenario()) == 2
+    assert attempts == 2
+    assert cancelled == [1]
+    assert outcomes == [True]
+
+
+def test_fast_call_is_not_hedged():
+    outcomes = []
+    attempts = 0
+
+    async def make_call():
+        nonlocal attempts
+        attempts += 1
+        return "ok"
+
+    hedger = Hedger("qdrant", initial_delay=0.05, on_hedge=lambda name, won: outcomes.append(won))
+    assert asyncio.run(hedger.call(make_call)) == "ok"
+    assert attempts == 1
+    assert outcomes == []
+
+
+def test_cancelling_the_caller_cancels_both_calls():
+    cancelled = []
+
+    async def make_call():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def scenario():
+        hedger = Hedger("qdrant", initial_delay=0.01)
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(hedger.call(make_call), 0.1)
+        await asyncio.sleep(0)
+
+    asyncio.run(scenario())
+    assert len(cancelled) == 2
+
+
+def test_hedge_delay_follows_the_latency_quantile():
+    hedger = Hedger("qdrant", quantile=0.9, min_samples=10, initial_delay=0.5, min_delay=0.001)
+    assert hedger.delay() == 0.5
+    hedger._latencies.extend(i / 100 for i in range(1, 11))
+    assert hedger.delay() == pytest.approx(0.09)
@@ -0,0 +1,69 @@
+import asyncio
+import time
+
+import grpc
+import pytest
+from qdrant_client import AsyncQdrantClient
+
+import main
+from exceptions import ExternalServiceError
+from resilience import CircuitBreaker
+
+
+@pytest.fixture
+def qdrant_breaker(monkeypatch):
+    breaker = CircuitBreaker("qdrant", failure_threshold=5, reset_timeout=60)
+    monkeypatch.setattr(main, "breakers", {"qdrant": breaker})
+    monkeypatch.setattr(main, "hedgers", {})
+    monkeypatch.setitem(main.config, "max_retries", 3)
+    monkeypatch.setitem(main.config, "base_delay", 0.0)
+    return breaker
+
+
+def test_qdrant_connection_failures_open_the_breaker(qdrant_breaker):
+    # nothing listens on port 1: qdrant-client raises ResponseHandlingException
+    client = AsyncQdrantClient(url="http://127.0.0.1:1", timeout=1)
+    calls = 0
+
+    async def search():
+        nonlocal calls
+        calls += 1
+        return await client.search(collection_name="papers", query_vector=[0.1, 0.2], limit=1)
+
+    async def scenario():
+        # every attempt is retried as transient and counted by the breaker
+        with pytest.raises(ExternalServiceError, match="failed after 3 attempts"):
+            await main.retry_async(search, dependency="qdrant")
+        assert (qdrant_breaker.state, qdrant_breaker.failures) == (CircuitBreaker.CLOSED, 3)
+
+        # the 5th consecutive failure opens the circuit, which stops the remaining retry
+        with pytest.raises(ExternalServiceError, match="circuit is open"):
+            await main.retry_async(search, dependency="qdrant")
+        assert qdrant_breaker.state == CircuitBreaker.OPEN
+        assert calls == 5
+        attempts = calls
+
+        start = time.perf_counter()
+        with pytest.raises(ExternalServiceError) as excinfo:
+            await main.retry_async(search, dependency="qdrant")
+        assert excinfo.value.status_code == 503
+        assert calls == attempts  # failed fast, qdrant was not called
+        assert time.perf_counter() - start < 0.05
+        await client.close()
+
+    asyncio.run(scenario())
+
+
+class FakeRpcError(grpc.RpcError):
+    def __init__(self, code):
+        self._code = code
+
+    def code(self):
+        return self._code
+
+
+def test_grpc_unavailable_and_deadline_are_transient():
+    assert main.is_transient(FakeRpcError(grpc.StatusCode.UNAVAILABLE))
+    assert main.is_transient(FakeRpcError(grpc.StatusCode.DEADLINE_EXCEEDED))
+    assert not main.is_transient(FakeRpcError(grpc.StatusCode.INVALID_ARGUMENT))
+    assert not main.is_transient(FakeRpcError(grpc.StatusCode.NOT_FOUND))
@@ -0,0 +1,53 @@
+from types import SimpleNamespace
+
+import grpc
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from qdrant_client.http.exceptions import UnexpectedResponse
+
+import main
+
+client = TestClient(main.app, raise_server_exceptions=False)
+
+
+class FakeRpcError(grpc.RpcError):
+    def __init__(self, code):
+        self._code = code
+
+    def code(self):
+        return self._code
+
+
+def qdrant_raising(error):
+    async def recommend(**kwargs):
+        raise error
+
+    return SimpleNamespace(qdrant=SimpleNamespace(recommend=recommend))
+
+
+@pytest.mark.parametrize(
+    "error",
+    [
+        UnexpectedResponse(404, "Not Found", b'{"status":{"error":"Not found: No point with id found"}}', httpx.Headers()),
+        FakeRpcError(grpc.StatusCode.NOT_FOUND),
+    ],
+    ids=["rest", "grpc"],
+)
+def test_unknown_paper_is_404(monkeypatch, error):
+    monkeypatch.setattr(main, "clients", qdrant_raising(error))
+    monkeypatch.setattr(main, "breakers", {})
+    monkeypatch.setattr(main, "hedgers", {})
+
+    response = client.get("/papers/2301.99999/similar")
+    assert response.status_code == 404
+    assert "not indexed" in response.json()["detail"]
+
+
+def test_other_grpc_errors_are_not_404(monkeypatch):
+    monkeypatch.setattr(main, "clients", qdrant_raising(FakeRpcError(grpc.StatusCode.INVALID_ARGUMENT)))
+    monkeypatch.setattr(main, "breakers", {})
+    monkeypatch.setattr(main, "hedgers", {})
+
+    response = client.get("/papers/2301.99999/similar")
+    assert response.status_code == 502
@@ -0,0 +1,107 @@
+import json
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import numpy as np
+
+# layout written by embedding/src/local_index.py
+VECTORS_FILE = "vectors.bin"
+IDS_FILE = "ids.txt"
+META_FILE = "meta.json"
+HNSW_FILE = "hnsw.bin"
+
+
+@dataclass
+class Hit:
+    """ mirrors the fields of a qdrant ScoredPoint that the search pipeline reads. """
+    id: int
+    score: float
+    payload: dict = field(default_factory=dict)
+
+
+class LocalVectorIndex:
+    """
+    embedded vector index over a memory-mapped matrix of normalized paper embeddings.
+
+    the matrix is opened with np.memmap, so every worker process on a host shares the same
+    page-cached file instead of holding its own copy. exact search is a chunked dot product
+    with argpartition top-k; an hnsw index (hnswlib) is used instead when `ann` is set and
+    one has been built.
+    """
+
+    def __init__(self, path, ann=False, ef=64, chunk_rows=65536):
+        index_dir = Path(path)
+        meta = json.loads((index_dir / META_FILE).read_text())
+        self.dim = meta["dim"]
+        self.count = meta["count"]
+        self.chunk_rows = chunk_rows
+
+        self.matrix = np.memmap(
+            index_dir / VECTORS_FILE, dtype=meta["dtype"], mode="r", shape=(self.count, self.dim)
+        )
+        with open(index_dir / IDS_FILE, "rb") as f:
+            self.ids = f.read(meta["ids_bytes"]).decode("utf-8").splitlines()
+
+        self.hnsw = None
+        if ann and (index_dir / HNSW_FILE).exists():
+            import hnswlib
+
+            self.hnsw = hnswlib.Index(space="ip", dim=self.dim)
+            self.hnsw.load_index(str(index_dir / HNSW_FILE), max_elements=self.count)
+            self.hnsw.set_ef(ef)
+
+        # paper id -> row, built on the first similar() call
+        self._rows = None
+
+    def _normalize(self, vector):
+        query = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        return query / norm if norm else query
+
+    def _exact(self, query, limit):
+        best_rows = np.empty(0, dtype=np.int64)
+        best_scores = np.empty(0, dtype=np.float32)
+
+        for start in range(0, self.count, self.chunk_rows):
+            # float16 rows are widened per chunk, numpy has no fast float16 matmul
+            rows = np.asarray(self.matrix[start : start + self.chunk_rows], dtype=np.float32)
+            scores = rows @ query
+            k = min(limit, len(scores))
+            top = np.argpartition(-scores, k - 1)[:k]
+            best_rows = np.concatenate([best_rows, top + start])
+            best_scores = np.concatenate([best_scores, scores[top]])
+
+        order = np.argsort(-best_scores)[:limit]
+        return best_rows[order], best_scores[order]
+
+    def _approximate(self, query, limit):
+        labels, distances = self.hnsw.knn_query(query, k=min(limit, self.count))
+        # hnswlib's "ip" space returns 1 - dot product
+        return labels[0].astype(np.int64), 1.0 - distances[0]
+
+    def search(self, vector, limit=10):
+        """ top `limit` hits by cosine similarity, best first. """
+        if self.count == 0:
+            return []
+
+        query = self._normalize(vector)
+        if self.hnsw is not None:
+            rows, scores = self._approximate(query, limit)
+        else:
+            rows, scores = self._exact(query, limit)
+
+        return [
+            Hit(id=int(row), score=float(score), payload={"paper_id": self.ids[row]})
+            for row, score in zip(rows, scores)
+        ]
+
+    def similar(self, paper_id, limit=10):
+        """ top `limit` hits for the stored vector of `paper_id`, without the paper itself; None if it is not indexed. """
+        if self._rows is None:
+            self._rows = {pid: row for row, pid in enumerate(self.ids)}
+        row = self._rows.get(paper_id)
+        if row is None:
+            return None
+
+        hits = self.search(np.asarray(self.matrix[row], dtype=np.float32), limit + 1)
+        return [hit for hit in hits if hit.id != row][:limit]